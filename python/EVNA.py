@@ -1,18 +1,15 @@
 import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
-import requests
 import io
 import threading
 import time
-import base64
+from camera_client import CameraClient, CameraThread
 
 # 摄像头地址
 CAMERA_URL = "http://192.168.0.250/cgi-bin/jpg/image.cgi?id=2&rand="
-# Basic Auth (Admin:1234 -> base64)
-AUTH_HEADER = {
-    "Authorization": "Basic " + base64.b64encode(b"Admin:1234").decode()
-}
+# Basic Auth (Admin:1234)；连接保持复用，命令不再每次重新握手
+CAMERA = CameraThread(CameraClient("http://192.168.0.250", "Admin", "1234", auth="basic"))
 
 
 class CameraApp:
@@ -90,9 +87,8 @@ class CameraApp:
         while self.running:
             try:
                 url = CAMERA_URL + str(time.time())
-                r = requests.get(url, headers=AUTH_HEADER, timeout=2)
-                if r.status_code == 200:
-                    image_data = r.content
+                image_data = CAMERA.call(CAMERA.client.get(url), timeout=3)
+                if image_data:
                     image = Image.open(io.BytesIO(image_data))
                     image = image.resize((640, 480))
                     photo = ImageTk.PhotoImage(image)
@@ -105,11 +101,21 @@ class CameraApp:
     # ---------- 发送命令 ----------
     def send_command(self, url, name="命令"):
         try:
-            r = requests.get(url, headers=AUTH_HEADER, timeout=2)
-            self.log(f"{name} -> {url} | 返回: {r.text.strip()}")
+            text = CAMERA.call(CAMERA.client.get(url), timeout=3).decode("utf-8", "replace")
+            self.log(f"{name} -> {url} | 返回: {text.strip()}")
         except Exception as e:
             self.log(f"{name} 请求失败: {e}")
 
+    def send_latest(self, key, url, name="命令"):
+        """设定值命令：不等返回；上一条还没发出去时只发最新的（连续调焦用）"""
+        def done(future):
+            try:
+                text = future.result().decode("utf-8", "replace")
+                self.log(f"{name} -> {url} | 返回: {text.strip()}")
+            except Exception as e:
+                self.log(f"{name} 请求失败: {e}")
+        CAMERA.submit(CAMERA.client.get_latest(key, url)).add_done_callback(done)
+
     # ---------- 增减聚焦 ----------
     def increase_focus(self):
         try:
@@ -223,7 +229,7 @@ class CameraApp:
             # 线性插值
             focus = int(start_focus + (end_focus - start_focus) * i / steps)
             url_focus = f"http://192.168.0.250/cgi-bin/com/ptz.cgi?focus={focus}"
-            self.send_command(url_focus, f"连续调焦-设置聚焦 {focus}")
+            self.send_latest("focus", url_focus, f"连续调焦-设置聚焦 {focus}")
             self.focus_set_var.set(str(focus))
             time.sleep(interval)
         self.continuous_adjusting = False
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圆检测离线基准测试（无需相机，无需界面）
+
+把一组帧依次送进各个检测流程，统计帧率、分阶段延迟分位数、内存峰值，
+有真值时统计圆心/半径误差，结果写成 JSON，方便前后对比。
+
+帧来源（三选一，默认合成）:
+    --synthetic N         生成 N 帧带黑色圆环的合成图（圆心/半径已知）
+    --video PATH          读取录像文件
+    --images DIR          读取目录下的图片
+真值（录像/图片可选）: --truth truth.json，格式 {"文件名或帧号": [x, y, r], ...}
+
+检测流程:
+    unv       unv_detect_server.detect_circle（unv 配置：阈值置白 + 高斯模糊 + 霍夫）
+    rtsp_unv  rtsp_unv 的 black_edge 配置（中值模糊 + 暗区 + 腐蚀 + 霍夫 + 黑边验证）
+    legacy    改造前 rtsp_unv.detect_circle 的原始流程（对照基线，不用引擎/金字塔/跟踪）
+    largest   detecet_cycle.detect_largest_circle（largest 配置：高斯模糊 + 霍夫取最大圆）
+
+回归门槛（--gate）：按 GATE_CASES 的几组半径合成圆环，比较 legacy 与新引擎
+rtsp_unv（不跟踪 / 跟踪）的命中数，任何一项比 legacy 少 GATE_SLACK
+帧以上就以退出码 1 结束。改检测参数（金字塔层数等）后先跑一遍。
+
+用法:
+    python bench_detect.py --synthetic 50 -o bench.json
+    python bench_detect.py --video ring.avi --detectors unv,largest --no-tracking
+    python bench_detect.py --gate
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from timing import LatencyStats, StageTimer, activate
+
+DETECTORS = ("unv", "rtsp_unv", "largest", "legacy")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+HIT_TOLERANCE = 10      # 圆心和半径误差都不超过多少像素算命中
+GATE_CASES = ((20, 60), (60, 150), (220, 330))     # 回归门槛的合成半径范围
+GATE_FRAMES = 20        # 每组合成帧数
+GATE_SLACK = 1          # 新引擎命中数最多比 legacy 少几帧
+
+
+# ---------- 帧来源 ----------
+def synthetic_frames(count, width=1280, height=720, radius=(220, 330),
+                     thickness=18, noise=8, seed=0):
+    """生成浅灰背景 + 黑色圆环的 BGR 帧，返回 [(名称, 图像, (x, y, r)), ...]"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        r = float(rng.uniform(*radius))
+        margin = r + thickness
+        x = float(rng.uniform(margin, width - margin)) if width > 2 * margin else width / 2
+        y = float(rng.uniform(margin, height - margin)) if height > 2 * margin else height / 2
+        image = np.full((height, width), 170, np.uint8)
+        # 亚像素圆心：坐标带 4 位二进制小数（shift=4，即 1/16 像素）
+        cv2.circle(image, (int(round(x * 16)), int(round(y * 16))), int(round(r * 16)),
+                   20, thickness, lineType=cv2.LINE_AA, shift=4)
+        if noise:
+            image = cv2.add(image, rng.normal(0, noise, image.shape).astype(np.int16),
+                            dtype=cv2.CV_8U)
+        frames.append((f"synthetic_{i:04d}", cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), (x, y, r)))
+    return frames
+
+
+def load_truth(path):
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {str(k): tuple(float(v) for v in value) for k, value in json.load(f).items()}
+
+
+def video_frames(path, truth, max_frames=None):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"无法打开录像: {path}")
+    frames = []
+    try:
+        while max_frames is None or len(frames) < max_frames:
+            ret, image = cap.read()
+            if not ret:
+                break
+            index = str(len(frames))
+            frames.append((index, image, truth.get(index)))
+    finally:
+        cap.release()
+    return frames
+
+
+def image_frames(directory, truth, max_frames=None):
+    paths = sorted(p for p in glob.glob(os.path.join(directory, "*"))
+                   if os.path.splitext(p)[1].lower() in IMAGE_EXTS)
+    frames = []
+    for path in paths[:max_frames]:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"[跳过] 无法读取 {path}")
+            continue
+        name = os.path.basename(path)
+        frames.append((name, image, truth.get(name)))
+    return frames
+
+
+# ---------- 检测流程 ----------
+def legacy_black_edge(image):
+    """改造前 rtsp_unv.detect_circle 的检测（原样保留，作为命中率对照），返回最大圆或 None"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    blurred = cv2.medianBlur(gray, 5)
+    _, dark = cv2.threshold(blurred, 25, 255, cv2.THRESH_BINARY_INV)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 1))
+    eroded = cv2.erode(dark, kernel, anchor=(-1, -1), iterations=4,
+                       borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    circles = cv2.HoughCircles(eroded, cv2.HOUGH_GRADIENT, dp=1.4, minDist=150,
+                               param1=100, param2=50, minRadius=10, maxRadius=900)
+    if circles is None:
+        return None
+    h, w = gray.shape
+    found = []
+    for x, y, r in np.uint16(np.around(circles))[0]:
+        x, y, r = int(x), int(y), int(r)
+        # 圆周 16 点平均灰度 < 55 算黑边
+        values = [gray[py, px] for px, py in
+                  ((int(x + r * np.cos(a)), int(y + r * np.sin(a))) for a in np.linspace(0, 2 * np.pi, 16))
+                  if 0 <= px < w and 0 <= py < h]
+        if values and np.mean(values) < 55:
+            found.append((float(x), float(y), float(r)))
+    return max(found, key=lambda c: c[2]) if found else None
+
+
+def make_detector(name, tracking):
+    """检测流程名 → detect(frame) -> (x, y, r) 或 None"""
+    if name == "unv":
+        import unv_detect_server
+        unv_detect_server.DETECTOR.tracking = tracking
+        unv_detect_server.DETECTOR.reset()
+
+        def detect(frame):
+            circle, _ = unv_detect_server.detect_circle(frame)
+            return circle
+        return detect
+
+    if name == "rtsp_unv":
+        import rtsp_unv
+        from detect_profiles import ProfileDetector, ProfileStore
+        # rtsp_unv 的检测就是按它的默认配置跑 CircleEngine，不需要界面
+        detector = ProfileDetector(ProfileStore(), rtsp_unv.PROFILE, tracking=tracking)
+
+        def detect(frame):
+            return detector.compute(frame).largest()
+        return detect
+
+    if name == "legacy":
+        return legacy_black_edge
+
+    if name == "largest":
+        import detecet_cycle
+
+        def detect(frame):
+            circle = detecet_cycle.detect_largest_circle(frame)
+            return None if circle is None else tuple(float(v) for v in circle)
+        return detect
+
+    raise ValueError(f"未知检测流程: {name}")
+
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize_errors(center_errors, radius_errors, hits, truthed, misses):
+    if not truthed:
+        return None
+    summary = {
+        "frames_with_truth": truthed,
+        "detected": truthed - misses,
+        "hits": hits,
+        "hit_rate": round(hits / truthed, 4),
+    }
+    for key, values in (("center_error_px", center_errors), ("radius_error_px", radius_errors)):
+        if values:
+            values = np.array(values)
+            summary[key] = {
+                "mean": round(float(values.mean()), 3),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+                "max": round(float(values.max()), 3),
+            }
+    return summary
+
+
+def run_detector(name, frames, tracking=True, warmup=2, repeat=1):
+    """对全部帧跑一个检测流程，返回结果字典"""
+    try:
+        detect = make_detector(name, tracking)
+    except ImportError as e:
+        print(f"[跳过] {name}: {e}")
+        return {"skipped": str(e)}
+
+    for _, image, _ in frames[:warmup]:
+        detect(image)
+
+    stats = LatencyStats(window=len(frames) * repeat)
+    center_errors, radius_errors = [], []
+    hits = truthed = misses = detected = 0
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _, image, truth in frames:
+            timer = StageTimer()
+            with activate(timer):
+                circle = detect(image)
+            stats.record(timer)
+            detected += circle is not None
+            if truth is None:
+                continue
+            truthed += 1
+            if circle is None:
+                misses += 1
+                continue
+            center_error = float(np.hypot(circle[0] - truth[0], circle[1] - truth[1]))
+            radius_error = abs(float(circle[2]) - truth[2])
+            center_errors.append(center_error)
+            radius_errors.append(radius_error)
+            hits += center_error <= HIT_TOLERANCE and radius_error <= HIT_TOLERANCE
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(frames) * repeat
+    return {
+        "frames": count,
+        "detected": detected,
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(count / elapsed, 2) if elapsed > 0 else None,
+        "stages_ms": stats.snapshot(),
+        "tracemalloc_peak_mb": round(peak / (1024 * 1024), 2),
+        "accuracy": summarize_errors(center_errors, radius_errors, hits, truthed, misses),
+    }
+
+
+def is_hit(circle, truth):
+    return (circle is not None and float(np.hypot(circle[0] - truth[0], circle[1] - truth[1])) <= HIT_TOLERANCE
+            and abs(float(circle[2]) - truth[2]) <= HIT_TOLERANCE)
+
+
+def regression_gate(frames=GATE_FRAMES, width=1280, height=720, seed=0):
+    """legacy 与 rtsp_unv 命中数对比，返回 (是否通过, 每组结果列表)"""
+    import rtsp_unv
+    from detect_profiles import ProfileDetector, ProfileStore
+
+    store = ProfileStore()
+    rows = []
+    passed = True
+    for lo, hi in GATE_CASES:
+        cases = synthetic_frames(frames, width, height, (lo, hi), seed=seed)
+        row = {"radius": [lo, hi], "legacy": sum(is_hit(legacy_black_edge(image), truth)
+                                                 for _, image, truth in cases)}
+        for variant, tracking in (("full", False), ("tracking", True)):
+            detector = ProfileDetector(store, rtsp_unv.PROFILE, tracking=tracking)
+            row[variant] = sum(is_hit(detector.compute(image).largest(), truth) for _, image, truth in cases)
+            passed &= row[variant] >= row["legacy"] - GATE_SLACK
+        rows.append(row)
+    return passed, rows
+
+
+def print_summary(results):
+    print(f"\n{'检测流程':<10} {'帧率':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'命中率':>7} {'圆心误差':>8} {'内存MB':>7}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<10} 跳过: {result['skipped']}")
+            continue
+        total = result["stages_ms"].get("total", {})
+        accuracy = result["accuracy"] or {}
+        center = accuracy.get("center_error_px", {}).get("p50")
+        print(f"{name:<10} {result['fps']:>8} {total.get('p50', '-'):>8} {total.get('p95', '-'):>8} "
+              f"{total.get('p99', '-'):>8} {accuracy.get('hit_rate', '-'):>7} "
+              f"{center if center is not None else '-':>8} {result['tracemalloc_peak_mb']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="圆检测离线基准测试")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--synthetic", type=int, metavar="N", help="合成 N 帧（默认 30）")
+    source.add_argument("--video", help="录像文件")
+    source.add_argument("--images", help="图片目录")
+    parser.add_argument("--truth", help="真值 JSON：{\"文件名或帧号\": [x, y, r]}")
+    parser.add_argument("--detectors", default=",".join(DETECTORS),
+                        help=f"逗号分隔，可选 {', '.join(DETECTORS)}")
+    parser.add_argument("--max-frames", type=int, default=None, help="最多读取多少帧")
+    parser.add_argument("--repeat", type=int, default=1, help="全部帧重复跑几遍")
+    parser.add_argument("--warmup", type=int, default=2, help="预热帧数（不计入统计）")
+    parser.add_argument("--no-tracking", action="store_true", help="关闭 ROI 跟踪，每帧全图搜索")
+    parser.add_argument("--size", default="1280x720", help="合成帧尺寸（默认 1280x720）")
+    parser.add_argument("--radius", type=float, nargs=2, default=(220, 330),
+                        metavar=("MIN", "MAX"), help="合成圆环半径范围")
+    parser.add_argument("--seed", type=int, default=0, help="合成帧随机种子")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="结果 JSON 路径")
+    parser.add_argument("--gate", action="store_true", help="只跑 legacy 对比回归门槛，不通过时退出码 1")
+    args = parser.parse_args()
+
+    if args.gate:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        passed, rows = regression_gate(args.synthetic or GATE_FRAMES, width, height, args.seed)
+        print(f"{'半径':<12} {'legacy':>7} {'full':>6} {'tracking':>9}")
+        for row in rows:
+            print(f"{'%d-%d' % tuple(row['radius']):<12} {row['legacy']:>7} {row['full']:>6} {row['tracking']:>9}")
+        print("[门槛] 通过" if passed else f"[门槛] 未通过：新引擎命中数比 legacy 少 {GATE_SLACK} 帧以上")
+        sys.exit(0 if passed else 1)
+
+    truth = load_truth(args.truth)
+    if args.video:
+        frames, source_desc = video_frames(args.video, truth, args.max_frames), args.video
+    elif args.images:
+        frames, source_desc = image_frames(args.images, truth, args.max_frames), args.images
+    else:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        count = args.synthetic or 30
+        frames = synthetic_frames(count, width, height, tuple(args.radius), seed=args.seed)
+        source_desc = f"synthetic:{count}@{width}x{height}"
+    if not frames:
+        raise SystemExit("没有可用的帧")
+    print(f"[基准] {source_desc}，共 {len(frames)} 帧")
+
+    output = os.path.abspath(args.output)
+    results = {}
+    for name in (n.strip() for n in args.detectors.split(",") if n.strip()):
+        print(f"[基准] 运行 {name} ...")
+        results[name] = run_detector(name, frames, tracking=not args.no_tracking,
+                                     warmup=args.warmup, repeat=args.repeat)
+
+    report = {
+        "source": source_desc,
+        "frames": len(frames),
+        "frame_shape": list(frames[0][1].shape),
+        "tracking": not args.no_tracking,
+        "repeat": args.repeat,
+        "max_rss_mb": max_rss_mb(),
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads(),
+        },
+        "results": results,
+        "timestamp": datetime.now().isoformat(),
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_summary(results)
+    print(f"\n[基准] 结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
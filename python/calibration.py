@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+距离 → 变焦/对焦 标定（calibration.json），替代 Node-RED "do auto" / "do zoom"
+里逐次线性扫描的分段插值
+
+每个镜头（相机 + 镜头一组标定点）每个轴（zoom / focus）拟合一条单调保形
+三次样条（PCHIP，Fritsch-Carlson）：数据单调的区间插值也单调，不会像普通
+三次样条那样冲过标定点；对焦曲线有拐点的地方在拐点处取平。超出标定范围
+取端点值（同 Node-RED）。
+
+加载时按 lut_step（默认 1 毫米）在标定范围内算好稠密查找表，之后每次求值
+只是一次下标计算加相邻两点线性插值，和标定点个数无关；setpoints() 可以
+一次算一整个 NumPy 距离数组（每个激光采样都能算，不用再经过 Node-RED）。
+
+    python calibration.py 10.5 12.3           # unv 镜头的设定值
+    python calibration.py --lens hk 3.0
+    python calibration.py --list
+
+文件修改后自动重新加载；有错时保留上一版。
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from hot_reload import HotReloadFile
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration.json")
+DEFAULT_LENS = "unv"
+AXES = ("zoom", "focus")
+LUT_STEP = 0.001    # 查找表步长（米）
+
+
+# ---------- 单调保形三次插值 ----------
+def pchip_slopes(x, y):
+    """Fritsch-Carlson 法计算各节点导数（和 scipy PchipInterpolator 一致）"""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    if len(x) == 2:
+        return np.array([delta[0], delta[0]])
+
+    d = np.zeros_like(y)
+    # 内部节点：相邻两段斜率同号时取加权调和平均，否则为 0（局部极值处取平）
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    d[1:-1] = np.where(same, harmonic, 0.0)
+
+    # 端点：三点公式，再做保形修正
+    def edge(h0, h1, m0, m1):
+        s = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        if np.sign(s) != np.sign(m0):
+            return 0.0
+        if np.sign(m0) != np.sign(m1) and abs(s) > abs(3 * m0):
+            return 3 * m0
+        return s
+
+    d[0] = edge(h[0], h[1], delta[0], delta[1])
+    d[-1] = edge(h[-1], h[-2], delta[-1], delta[-2])
+    return d
+
+
+class PchipCurve:
+    """单调保形三次插值曲线，超出范围取端点值"""
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.d = pchip_slopes(self.x, self.y)
+
+    def __call__(self, t):
+        t = np.clip(np.asarray(t, dtype=float), self.x[0], self.x[-1])
+        i = np.clip(np.searchsorted(self.x, t, side="right") - 1, 0, len(self.x) - 2)
+        x0, h = self.x[i], self.x[i + 1] - self.x[i]
+        s = (t - x0) / h
+        y0, y1, d0, d1 = self.y[i], self.y[i + 1], self.d[i] * h, self.d[i + 1] * h
+        # 三次 Hermite 基函数
+        s2, s3 = s * s, s * s * s
+        return ((2 * s3 - 3 * s2 + 1) * y0 + (s3 - 2 * s2 + s) * d0
+                + (-2 * s3 + 3 * s2) * y1 + (s3 - s2) * d1)
+
+
+# ---------- 一个镜头的标定 ----------
+class LensCalibration:
+    def __init__(self, name, points, lut_step=LUT_STEP, note=None):
+        self.name = name
+        self.note = note
+        self.axes = tuple(a for a in AXES if points and all(a in p for p in points))
+        if not self.axes:
+            raise ValueError(f"镜头 {name}: 标定点缺少 zoom/focus")
+
+        # 同一距离的多个点取平均，按距离排序
+        grouped = {}
+        for p in points:
+            distance = float(p["distance"])
+            grouped.setdefault(distance, []).append([float(p[a]) for a in self.axes])
+        distances = np.array(sorted(grouped))
+        if len(distances) < 2:
+            raise ValueError(f"镜头 {name}: 至少需要两个不同距离的标定点")
+        values = np.array([np.mean(grouped[d], axis=0) for d in distances])
+
+        self.distances = distances
+        self.curves = {a: PchipCurve(distances, values[:, k]) for k, a in enumerate(self.axes)}
+
+        # 稠密查找表：lut[k] 是第 k 个轴在 d0 + i * step 处的值
+        self.lut_step = float(lut_step)
+        self.d0 = distances[0]
+        n = int(np.ceil((distances[-1] - self.d0) / self.lut_step)) + 1
+        grid = np.minimum(self.d0 + np.arange(n) * self.lut_step, distances[-1])
+        self.lut = np.stack([self.curves[a](grid) for a in self.axes])
+
+    @property
+    def range(self):
+        return float(self.distances[0]), float(self.distances[-1])
+
+    def evaluate(self, distances):
+        """
+        批量求值：distances 为标量或数组，返回 {轴: 与输入同形状的浮点数组}
+        查表 O(1)：下标 = (距离 - d0) / 步长，相邻两项线性插值
+        """
+        pos = (np.asarray(distances, dtype=float) - self.d0) / self.lut_step
+        pos = np.clip(pos, 0, self.lut.shape[1] - 1)
+        i = np.minimum(pos.astype(np.intp), self.lut.shape[1] - 2)
+        frac = pos - i
+        values = self.lut[:, i] * (1 - frac) + self.lut[:, i + 1] * frac
+        return {a: values[k] for k, a in enumerate(self.axes)}
+
+    def exact(self, distances):
+        """不查表直接算样条（校验查找表用）"""
+        return {a: self.curves[a](distances) for a in self.axes}
+
+    def setpoints(self, distances):
+        """相机设定值（取整）：{轴: int 数组}"""
+        return {a: np.rint(v).astype(np.int64) for a, v in self.evaluate(distances).items()}
+
+    def setpoint(self, distance):
+        """单个距离 → {"distance": d, "zoom": z, "focus": f}"""
+        result = {"distance": float(distance)}
+        result.update({a: int(v) for a, v in self.setpoints(distance).items()})
+        return result
+
+    def info(self):
+        return {"axes": list(self.axes), "range": list(self.range),
+                "points": len(self.distances), "lut_size": int(self.lut.shape[1]), "note": self.note}
+
+
+def load_lenses(data):
+    """文件内容 → {镜头名: LensCalibration}，有错抛 ValueError"""
+    lenses = {}
+    for name, cfg in (data.get("lenses") or {}).items():
+        try:
+            lenses[name] = LensCalibration(name, cfg["points"], cfg.get("lut_step", LUT_STEP),
+                                           cfg.get("note"))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"镜头 {name} 标定格式错误: {e}")
+    return lenses
+
+
+# ---------- 文件加载（热加载） ----------
+class CalibrationStore(HotReloadFile):
+    label = "标定"
+
+    def __init__(self, path=CALIBRATION_FILE, check_interval=1.0):
+        super().__init__(path, check_interval)
+
+    def load(self, mtime):
+        if mtime is None:
+            raise OSError(f"标定文件不存在: {self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            return load_lenses(json.load(f))
+
+    def fallback(self):
+        return {}
+
+    def describe(self, lenses):
+        return ", ".join(sorted(lenses))
+
+    def get(self, name=DEFAULT_LENS):
+        """取镜头标定，未知名称抛 KeyError"""
+        self.maybe_reload()
+        return self.value[name]
+
+    def has(self, name):
+        self.maybe_reload()
+        return name in self.value
+
+    def info(self):
+        self.maybe_reload()
+        return {
+            "version": self.version,
+            "lenses": {name: lens.info() for name, lens in sorted(self.value.items())},
+            "last_error": self.last_error,
+        }
+
+
+def setpoint_command(store, cmd, default_lens=DEFAULT_LENS):
+    """
+    setpoint 命令：{"cmd": "setpoint", "distance": 10.5 或 [..], "lens": "unv"}
+    返回单个设定值或列表（和 distance 的形式一致）
+    """
+    from detect_tcp_server import error_response
+
+    lens_name = cmd.get("lens") or default_lens
+    if not store.has(lens_name):
+        return error_response("unknown_lens", f"未知镜头标定: {lens_name}", "setpoint")
+    distance = cmd.get("distance")
+    try:
+        # None / "nan" / [1, null] 会变成 NaN，查表下标溢出；inf 会回显成非标准 JSON
+        distances = None if distance is None else np.asarray(distance, dtype=float)
+    except (TypeError, ValueError):
+        distances = None
+    if (distances is None or distances.ndim > 1 or distances.size == 0
+            or not np.isfinite(distances).all()):
+        return error_response("invalid_param", "distance 必须是有限的数字或数字列表", "setpoint")
+
+    lens = store.get(lens_name)
+    response = {"success": True, "cmd": "setpoint", "lens": lens_name}
+    if distances.ndim == 0:
+        response.update(lens.setpoint(distances))
+    else:
+        values = lens.setpoints(distances)
+        response["setpoints"] = [
+            dict({"distance": float(d)}, **{a: int(values[a][k]) for a in lens.axes})
+            for k, d in enumerate(distances)
+        ]
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="距离 → 变焦/对焦设定值")
+    parser.add_argument("distance", type=float, nargs="*", help="激光测距（米）")
+    parser.add_argument("--lens", default=DEFAULT_LENS, help="镜头标定名（默认 unv）")
+    parser.add_argument("--file", default=CALIBRATION_FILE, help="标定文件")
+    parser.add_argument("--list", action="store_true", help="列出所有镜头标定")
+    args = parser.parse_args()
+
+    store = CalibrationStore(args.file)
+    if args.list or not args.distance:
+        print(json.dumps(store.info(), indent=2, ensure_ascii=False))
+        return
+    response = setpoint_command(store, {"distance": args.distance, "lens": args.lens})
+    print(json.dumps(response, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+相机控制 HTTP 客户端（asyncio + aiohttp）：UNV LAPI、海康 ISAPI
+
+原来每条 PTZ/对焦命令都 requests.get 一次：新建 TCP 连接，Digest 认证还要
+先吃一个 401 再重发，连续调焦时 HTTP 开销比相机动作还慢。这里：
+
+- 每台相机一个 ClientSession，连接保持（keep-alive）复用
+- 缓存 Digest 质询（realm/nonce/opaque），之后的请求直接带 Authorization，
+  nc 递增；nonce 过期（再次 401）时更新质询重发一次
+- 每台相机限制并发请求数（信号量），相机的 HTTP 服务很弱，排队比打满好
+- 设定值命令按 key 合并（latest-wins）：同一个 key 上一条还没发出去时来了
+  新的，只发最新的；被取代的调用拿到最终实际发送那条的结果
+
+    async with HikClient("http://192.168.1.64", "admin", "***") as cam:
+        await cam.set_absolute(zoom=13200, focus=47000)
+        jpeg = await cam.picture()
+
+线程/Tk 代码用 CameraThread：后台线程跑事件循环，call() 阻塞等结果，
+submit() 立即返回 concurrent.futures.Future。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+TIMEOUT = 3                 # 单次请求超时（秒）
+MAX_CONCURRENCY = 2         # 每台相机同时进行的请求数
+KEEPALIVE_TIMEOUT = 30      # 空闲连接保留多久（秒）
+
+
+# ---------- Digest 认证 ----------
+def parse_challenge(header):
+    """'Digest realm="x", nonce="y", qop="auth"' → {"realm": "x", ...}，不是 Digest 返回 None"""
+    scheme, _, params = header.partition(" ")
+    if scheme.lower() != "digest":
+        return None
+    return {k.lower(): v1 or v2 for k, v1, v2 in
+            re.findall(r'(\w+)\s*=\s*(?:"([^"]*)"|([^,\s]*))', params)}
+
+
+class DigestAuth:
+    """缓存质询的 Digest 认证：只有第一次（和 nonce 过期时）需要 401 往返"""
+
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self.challenge = None
+        self.nc = 0
+        self._lock = threading.Lock()
+
+    def update(self, header):
+        """从 401 的 WWW-Authenticate 更新质询，返回是否是 Digest"""
+        challenge = parse_challenge(header or "")
+        if challenge is None:
+            return False
+        with self._lock:
+            self.challenge = challenge
+            self.nc = 0
+        return True
+
+    def _hash(self, algorithm, text):
+        name = "sha256" if algorithm.upper().startswith("SHA-256") else "md5"
+        return hashlib.new(name, text.encode("utf-8")).hexdigest()
+
+    def header(self, method, uri):
+        """当前质询下 method + uri 的 Authorization 头；还没有质询时返回 None"""
+        with self._lock:
+            c = self.challenge
+            if c is None:
+                return None
+            self.nc += 1
+            nc = f"{self.nc:08x}"
+        algorithm = c.get("algorithm", "MD5")
+        realm, nonce = c.get("realm", ""), c.get("nonce", "")
+        cnonce = os.urandom(8).hex()
+        ha1 = self._hash(algorithm, f"{self.user}:{realm}:{self.password}")
+        if algorithm.upper().endswith("-SESS"):
+            ha1 = self._hash(algorithm, f"{ha1}:{nonce}:{cnonce}")
+        ha2 = self._hash(algorithm, f"{method}:{uri}")
+        qop = c.get("qop")
+        if qop:
+            qop = "auth" if "auth" in [q.strip() for q in qop.split(",")] else qop
+            response = self._hash(algorithm, f"{ha1}:{nonce}:{nc}:{cnonce}:{qop}:{ha2}")
+        else:
+            response = self._hash(algorithm, f"{ha1}:{nonce}:{ha2}")
+
+        parts = [f'username="{self.user}"', f'realm="{realm}"', f'nonce="{nonce}"',
+                 f'uri="{uri}"', f'algorithm={algorithm}', f'response="{response}"']
+        if qop:
+            parts += [f"qop={qop}", f"nc={nc}", f'cnonce="{cnonce}"']
+        if "opaque" in c:
+            parts.append(f'opaque="{c["opaque"]}"')
+        return "Digest " + ", ".join(parts)
+
+
+# ---------- 最新值合并 ----------
+class LatestWins:
+    """
+    同一个 key 的命令串行发送，排队期间只保留最新的一条
+    被取代的调用和最新那条一起返回最终发送的结果
+    """
+
+    def __init__(self):
+        self._pending = {}      # key → (factory, [future, ...])
+        self._running = set()
+        self.sent = 0           # 实际发送的命令数
+        self.superseded = 0     # 被新命令取代、没有发送的命令数
+
+    async def submit(self, key, factory):
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(key)
+        waiters = [future]
+        if pending is not None:
+            self.superseded += 1
+            waiters = pending[1] + waiters
+        self._pending[key] = (factory, waiters)
+        if key not in self._running:
+            self._running.add(key)
+            asyncio.ensure_future(self._drain(key))
+        return await future
+
+    async def _drain(self, key):
+        try:
+            while key in self._pending:
+                factory, waiters = self._pending.pop(key)
+                self.sent += 1
+                try:
+                    result = await factory()
+                except Exception as e:
+                    for w in waiters:
+                        if not w.done():
+                            w.set_exception(e)
+                else:
+                    for w in waiters:
+                        if not w.done():
+                            w.set_result(result)
+        finally:
+            self._running.discard(key)
+
+
+# ---------- 通用客户端 ----------
+class CameraError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class CameraClient:
+    def __init__(self, base_url, user=None, password=None, auth="digest",
+                 max_concurrency=MAX_CONCURRENCY, timeout=TIMEOUT):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.user = user
+        self.password = password
+        self.digest = DigestAuth(user, password) if user and auth == "digest" else None
+        self.basic = aiohttp.BasicAuth(user, password or "") if user and auth == "basic" else None
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.latest = LatestWins()
+        self.session = None
+        self._sem = None
+        self.requests = 0       # 发出的 HTTP 请求数（含认证重发）
+        self.challenges = 0     # 401 质询次数
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self.max_concurrency,
+                                             keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                 auth=self.basic)
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def url(self, path):
+        return path if "://" in path else self.base_url + path.lstrip("/")
+
+    async def request(self, method, path, data=None, headers=None):
+        """发送请求，返回 (状态码, 响应字节)；认证失败或 4xx/5xx 抛 CameraError"""
+        await self.open()
+        url = self.url(path)
+        parts = urlsplit(url)
+        uri = parts.path + ("?" + parts.query if parts.query else "")
+        async with self._sem:
+            for attempt in range(2):
+                h = dict(headers or {})
+                auth = self.digest.header(method, uri) if self.digest else None
+                if auth:
+                    h["Authorization"] = auth
+                self.requests += 1
+                async with self.session.request(method, url, data=data, headers=h) as resp:
+                    body = await resp.read()
+                    if resp.status == 401 and self.digest and attempt == 0:
+                        # 第一次请求或 nonce 过期：更新质询后重发
+                        self.challenges += 1
+                        if self.digest.update(resp.headers.get("WWW-Authenticate")):
+                            continue
+                    if resp.status >= 400:
+                        raise CameraError(resp.status, body[:200].decode("utf-8", "replace"))
+                    return resp.status, body
+        raise CameraError(401, "认证失败")
+
+    async def get(self, path):
+        return (await self.request("GET", path))[1]
+
+    async def put(self, path, data, content_type="application/json"):
+        if not isinstance(data, (bytes, str)):
+            data = json.dumps(data)
+        return (await self.request("PUT", path, data, {"Content-Type": content_type}))[1]
+
+    async def put_latest(self, key, path, data, content_type="application/json"):
+        """设定值命令：同一个 key 排队期间只发送最新的一条"""
+        return await self.latest.submit(key, lambda: self.put(path, data, content_type))
+
+    async def get_latest(self, key, path):
+        """GET 形式的设定值命令（例如 cgi 接口），同样只发送最新的一条"""
+        return await self.latest.submit(key, lambda: self.get(path))
+
+    def stats(self):
+        return {"requests": self.requests, "challenges": self.challenges,
+                "sent": self.latest.sent, "superseded": self.latest.superseded}
+
+
+# ---------- UNV LAPI ----------
+class UnvClient(CameraClient):
+    ZOOM_FOCUS = "LAPI/V1.0/PTZ/ZoomFocusPos?ChannelID=0"
+    PTZ_CTRL = "LAPI/V1.0/Channel/0/PTZ/PTZCtrl"
+    PTZ_AUTO_FOCUS = 519    # PTZCmd：一次自动对焦（node-red AUTO_FOCUS）
+
+    async def zoom_focus(self):
+        """读取当前 {"ZoomPos": .., "FocusPos": ..}"""
+        data = json.loads(await self.get(self.ZOOM_FOCUS))
+        return data.get("Response", {}).get("Data", data)
+
+    async def set_zoom_focus(self, zoom, focus=None, trigger_focus=False):
+        """设定变焦（和对焦）位置；不给 focus 时由相机对焦（同 node-red function 56）"""
+        payload = {"ZoomPos": int(zoom), "NotTriggerFocus": 0 if trigger_focus or focus is None else 1}
+        if focus is not None:
+            payload.update({"FocusPos": int(focus), "FocusCorrectPara": 257})
+        return json.loads(await self.put_latest("zoom_focus", self.ZOOM_FOCUS, payload))
+
+    async def ptz_ctrl(self, cmd, para1=0, para2=0, para3=0, continue_time=0):
+        payload = {"PTZCmd": cmd, "ContinueTime": continue_time,
+                   "Para1": para1, "Para2": para2, "Para3": para3}
+        return json.loads(await self.put(self.PTZ_CTRL, payload))
+
+    async def auto_focus(self):
+        return await self.ptz_ctrl(self.PTZ_AUTO_FOCUS)
+
+
+# ---------- 海康 ISAPI ----------
+class HikClient(CameraClient):
+    def __init__(self, base_url, user=None, password=None, channel=1, stream=101, **kwargs):
+        super().__init__(base_url, user, password, **kwargs)
+        self.channel = channel
+        self.stream = stream
+
+    async def set_absolute(self, zoom, focus, speed=5):
+        """absoluteEx 设定变焦/对焦（同 node-red camera_hk function 6）"""
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+               '<PTZAbsoluteEx xmlns="http://www.isapi.org/ver20/XMLSchema" version="2.0">'
+               f'<absoluteZoom>{int(zoom)}</absoluteZoom><focus>{int(focus)}</focus>'
+               f'<horizontalSpeed>{speed}</horizontalSpeed></PTZAbsoluteEx>')
+        path = f"ISAPI/PTZCtrl/channels/{self.channel}/absoluteEx"
+        return await self.put_latest("absolute", path, xml, "application/xml")
+
+    async def status(self):
+        """PTZ 状态 XML"""
+        return (await self.get(f"ISAPI/PTZCtrl/channels/{self.channel}/status")).decode("utf-8")
+
+    async def picture(self):
+        """抓拍一张 JPEG，返回字节"""
+        return await self.get(f"ISAPI/Streaming/channels/{self.stream}/picture")
+
+
+# ---------- 给线程/Tk 代码用 ----------
+class CameraThread:
+    """后台线程跑事件循环，同步代码通过它调用异步客户端"""
+
+    def __init__(self, client):
+        self.client = client
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="camera-client", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """立即返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout=None):
+        """阻塞等待结果"""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        self.call(self.client.close(), timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="相机控制客户端：连续设定对焦测吞吐")
+    parser.add_argument("url", help="相机地址，如 http://192.168.1.13")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--type", choices=["unv", "hk"], default="unv")
+    parser.add_argument("--zoom", type=int, default=1316)
+    parser.add_argument("--sweep", type=int, nargs=2, default=[2600, 386], help="对焦扫描起止")
+    parser.add_argument("-n", type=int, default=80, help="扫描步数")
+    args = parser.parse_args()
+
+    async def sweep():
+        cls = UnvClient if args.type == "unv" else HikClient
+        async with cls(args.url, args.user, args.password) as cam:
+            start, end = args.sweep
+            t0 = time.perf_counter()
+            tasks = []
+            for i in range(args.n + 1):
+                focus = int(start + (end - start) * i / args.n)
+                if args.type == "unv":
+                    tasks.append(asyncio.ensure_future(cam.set_zoom_focus(args.zoom, focus)))
+                else:
+                    tasks.append(asyncio.ensure_future(cam.set_absolute(args.zoom, focus)))
+                await asyncio.sleep(0.05)
+            await asyncio.gather(*tasks)
+            print(f"{args.n + 1} 个设定值，用时 {time.perf_counter() - t0:.2f}s，{cam.stats()}")
+
+    asyncio.run(sweep())
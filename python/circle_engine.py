@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圆检测引擎（无界面、可重入）
+
+预处理 → 金字塔霍夫 → 黑边验证（可选）。预处理有三种：
+    dark   中值模糊 → 暗区阈值 → 腐蚀（rtsp_unv 的黑边框圆）
+    clip   灰度 >= clip_thresh 的像素置白 → 高斯模糊（unv_detect_server）
+    blur   只做高斯模糊（detecet_cycle）
+参数在创建时配置一次，detect() 只读这些参数，不写文件、不碰界面，多个
+线程可以同时对不同帧调用同一个引擎。跟踪状态（CircleTracker）属于某一路
+视频，由调用方传入。各场景的参数集见 detect_profiles.py。
+
+中间图写进每线程预分配的缓冲区（work_buffers.py），稳定运行后每次检测
+不再分配整帧数组；结果里的 debug 中间图因此只在下一次检测前有效。
+
+rtsp_unv.py 的界面和 TCP 服务、多相机服务的 black_edge 配置、
+bench_detect.py 都直接使用这个引擎。
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from circle_tracker import SEARCH_FULL, SEARCH_ROI
+from pyramid_hough import hough_pyramid
+from ring_verify import verify_circles
+from timing import stage
+from work_buffers import WorkBuffers
+
+
+class DetectResult(namedtuple("DetectResult", ["circles", "search", "shape", "debug"])):
+    """
+    一次检测的结果
+    circles: [(x, y, r), ...] 全图坐标的亚像素浮点，按半径从大到小
+    search:  full / roi
+    shape:   图像 (高, 宽)
+    debug:   中间图（dark: blurred/dark/eroded，clip: filtered/blurred，blur: blurred），
+             未要求时为 None；
+             是工作缓冲区的视图，要保留必须拷贝（DebugWriter.submit 会拷贝）
+    """
+    __slots__ = ()
+
+    def largest(self):
+        return self.circles[0] if self.circles else None
+
+    def int_circles(self):
+        """取整后的 [(x, y, r), ...]，用于绘制"""
+        return [(int(round(x)), int(round(y)), int(round(r))) for x, y, r in self.circles]
+
+    def response(self):
+        """rtsp_unv 的 JSON 响应格式"""
+        h, w = self.shape
+        results = []
+        for (fx, fy, fr), (x, y, r) in zip(self.circles, self.int_circles()):
+            results.append({
+                "center_x": x,
+                "center_y": y,
+                "radius": r,
+                "diameter": 2 * r,
+                "subpixel": {"x": round(fx, 2), "y": round(fy, 2), "radius": round(fr, 2)},
+                "image": {"width": int(w), "height": int(h)},
+            })
+        if results:
+            return {"status": "success", "circles": results, "search": self.search}
+        return {"status": "success", "circles": [], "message": "未检测到圆", "search": self.search}
+
+    def command_response(self, frame_seq, shared=False):
+        """unv_detect_server / 多相机服务 detect 命令的 JSON 响应格式（只报最大的圆）"""
+        h, w = self.shape
+        circle = self.largest()
+        if circle:
+            x, y, r = circle
+            return {
+                "success": True,
+                "cmd": "detect",
+                "circle": {
+                    "center": {"x": int(round(x)), "y": int(round(y))},
+                    "radius": int(round(r)),
+                    "diameter": int(round(r * 2)),
+                    "subpixel": {"x": round(x, 2), "y": round(y, 2), "radius": round(r, 2)}
+                },
+                "image": {"width": int(w), "height": int(h)},
+                "frame_seq": frame_seq,
+                "search": self.search,
+                "shared": shared,
+                "timestamp": datetime.now().isoformat()
+            }
+        return {
+            "success": False,
+            "error": "no_circle",
+            "cmd": "detect",
+            "message": "未检测到有效圆形",
+            "image": {"width": int(w), "height": int(h)},
+            "frame_seq": frame_seq,
+            "search": self.search,
+            "shared": shared,
+            "timestamp": datetime.now().isoformat()
+        }
+
+def is_center_region(x, y, img_width, img_height, grid_size=5):
+    """
+    判断圆心是否落在 grid_size x grid_size 网格的正中心方块内
+    grid_size=5 → 25个方块，中间那个是第3行第3列
+    """
+    cell_w = img_width // grid_size
+    cell_h = img_height // grid_size
+    center_idx = grid_size // 2
+    min_x, max_x = center_idx * cell_w, (center_idx + 1) * cell_w
+    min_y, max_y = center_idx * cell_h, (center_idx + 1) * cell_h
+    return min_x <= x <= max_x and min_y <= y <= max_y
+
+
+PREFILTER_DARK = "dark"
+PREFILTER_CLIP = "clip"
+PREFILTER_BLUR = "blur"
+PREFILTERS = (PREFILTER_DARK, PREFILTER_CLIP, PREFILTER_BLUR)
+
+
+class CircleEngine:
+    def __init__(self, min_radius=10, max_radius=900, prefilter=PREFILTER_DARK,
+                 blur_ksize=5, dark_thresh=25,
+                 erode_kernel=(1, 1), erode_iterations=4,
+                 clip_thresh=50, gauss_ksize=9, gauss_sigma=2,
+                 dp=1.4, min_dist=150, param1=100, param2=50,
+                 pyramid_levels="auto", edge_threshold=55, edge_thickness=3,
+                 center_grid=None):
+        if prefilter not in PREFILTERS:
+            raise ValueError(f"未知预处理方式: {prefilter}")
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.prefilter = prefilter
+        self.blur_ksize = blur_ksize            # dark：中值模糊核（最抗盐椒噪声）
+        self.dark_thresh = dark_thresh          # dark：只保留极暗区域（黑胶带通常 < 60）
+        self.erode_kernel = tuple(erode_kernel)
+        self.erode_iterations = erode_iterations
+        self.clip_thresh = clip_thresh          # clip：灰度 >= 此值的像素置白
+        self.gauss_ksize = (gauss_ksize, gauss_ksize)   # clip/blur：高斯模糊
+        self.gauss_sigma = gauss_sigma
+        self.dp = dp
+        self.min_dist = min_dist                # 圆很大，最小圆心距设大点防重检
+        self.param1 = param1
+        self.param2 = param2                    # 调低能检测不完整圆
+        # 全图搜索的金字塔层数（0 关闭，"auto" 按半径下限选）。填整数时也会按本次的
+        # 半径下限封顶（粗层半径不足 MIN_COARSE_RADIUS 就少降几层），小圆不会丢；
+        # 粗黑环在粗层定位偏差大、精修常失败，black_edge 配置用 0 层（全分辨率）
+        self.pyramid_levels = pyramid_levels
+        self.edge_threshold = edge_threshold    # 圆周平均灰度低于此值算黑边，None 不验证
+        self.edge_thickness = edge_thickness
+        self.center_grid = center_grid          # 设为 N 时只保留圆心在 NxN 网格中心格的圆
+        # 结构元素只建一次，所有线程共用（只读）
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, self.erode_kernel)
+        self.buffers = WorkBuffers()
+
+    # ---------- 检测 ----------
+    def detect(self, image, tracker=None, debug=False, band=None):
+        """
+        对一帧（BGR 或灰度）检测黑边框圆，返回 DetectResult
+        tracker: 可选 CircleTracker，命中后下一次只搜上次圆附近的 ROI
+        debug:   True 时在结果里附带中间图
+        band:    可选 radius_band.RadiusBand，本次用它的半径范围和 minDist
+                 代替配置里的值（按测距估计的目标大小）
+        """
+        if band is not None:
+            min_radius, max_radius, min_dist = band.min_radius, band.max_radius, band.min_dist
+        else:
+            min_radius, max_radius, min_dist = self.min_radius, self.max_radius, self.min_dist
+        if image.ndim == 3:
+            with stage("cvtColor"):
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY,
+                                    dst=self.buffers.get("gray", image.shape[:2]))
+        else:
+            gray = image
+        h, w = gray.shape
+        full = (0, 0, w, h)
+
+        if tracker is not None:
+            search, roi, lo, hi = tracker.plan(gray.shape, min_radius, max_radius)
+        else:
+            search, roi, lo, hi = SEARCH_FULL, full, min_radius, max_radius
+        levels = self.pyramid_levels if search == SEARCH_FULL else 0
+        candidates, debug_images = self.find_candidates(gray, roi, lo, hi, levels, debug, min_dist)
+        found = self.verify_candidates(gray, candidates)
+        if not found and search == SEARCH_ROI:
+            # ROI 内未命中：本次直接回退全图搜索
+            search = SEARCH_FULL
+            candidates, debug_images = self.find_candidates(
+                gray, full, min_radius, max_radius, self.pyramid_levels, debug, min_dist)
+            found = self.verify_candidates(gray, candidates)
+
+        found.sort(key=lambda c: c[2], reverse=True)
+        if tracker is not None:
+            tracker.update(search, found[0] if found else None)
+        return DetectResult(found, search, (h, w), debug_images)
+
+    def find_candidates(self, gray, roi, min_radius, max_radius, levels=0, debug=False, min_dist=None):
+        """
+        在 roi=(x0, y0, x1, y1) 内找霍夫候选圆，min_dist 默认取配置值
+        返回 (全图坐标的浮点 (N, 3) 数组或 None, 中间图字典或 None)
+        """
+        x0, y0, x1, y1 = roi
+        sub = gray[y0:y1, x0:x1]
+        if self.prefilter == PREFILTER_DARK:
+            edges, debug_images = self._prefilter_dark(sub)
+        elif self.prefilter == PREFILTER_CLIP:
+            edges, debug_images = self._prefilter_clip(sub)
+        else:
+            with stage("blur"):
+                edges = cv2.GaussianBlur(sub, self.gauss_ksize, self.gauss_sigma,
+                                         dst=self.buffers.get("blurred", sub.shape))
+            debug_images = {"blurred": edges}
+
+        # 粗到精：先在金字塔粗层找候选，再在全分辨率窗口内精修
+        with stage("hough"):
+            circles = hough_pyramid(
+                edges,
+                dp=self.dp,
+                min_dist=self.min_dist if min_dist is None else min_dist,
+                param1=self.param1,
+                param2=self.param2,
+                min_radius=min_radius,
+                max_radius=max_radius,
+                levels=levels
+            )
+
+        if not debug:
+            debug_images = None
+        if circles is None:
+            return None, debug_images
+        circles[:, 0] += x0
+        circles[:, 1] += y0
+        return circles, debug_images
+
+    def _prefilter_dark(self, sub):
+        shape = sub.shape
+        # 1. 轻微模糊（保留粗黑边）
+        with stage("medianBlur"):
+            blurred = cv2.medianBlur(sub, self.blur_ksize, dst=self.buffers.get("blurred", shape))
+
+        # 2. 只提取极暗的区域，比 Canny 更稳（圆是纯黑粗线）
+        with stage("threshold"):
+            _, dark = cv2.threshold(blurred, self.dark_thresh, 255, cv2.THRESH_BINARY_INV,
+                                    dst=self.buffers.get("dark", shape))
+
+        # 3. 腐蚀
+        with stage("erode"):
+            eroded = cv2.erode(dark, self.kernel, dst=self.buffers.get("eroded", shape),
+                               anchor=(-1, -1), iterations=self.erode_iterations,
+                               borderType=cv2.BORDER_CONSTANT, borderValue=0)
+        return eroded, {"blurred": blurred, "dark": dark, "eroded": eroded}
+
+    def _prefilter_clip(self, sub):
+        shape = sub.shape
+        # 保留灰度 < clip_thresh 的像素，其他设为 255（白色）：
+        # 阈值得到亮处为 255 的掩码，再和原图取最大值，全程写进预分配缓冲区
+        with stage("threshold"):
+            mask = self.buffers.get("mask", shape)
+            cv2.threshold(sub, self.clip_thresh - 1, 255, cv2.THRESH_BINARY, dst=mask)
+            filtered = cv2.max(sub, mask, dst=self.buffers.get("filtered", shape))
+
+        with stage("blur"):
+            blurred = cv2.GaussianBlur(filtered, self.gauss_ksize, self.gauss_sigma,
+                                       dst=self.buffers.get("blurred", shape))
+        return blurred, {"filtered": filtered, "blurred": blurred}
+
+    def verify_candidates(self, gray, circles):
+        """返回通过黑边框检查的 [(x, y, r), ...]（亚像素浮点）"""
+        if circles is None:
+            return []
+        h, w = gray.shape
+        if self.edge_threshold is None:
+            return [(float(x), float(y), float(r)) for x, y, r in circles
+                    if self.center_grid is None or is_center_region(x, y, w, h, self.center_grid)]
+        # 所有候选一次性取圆周像素
+        with stage("verify"):
+            edge_dark = self.black_edge_scores(gray, np.round(circles)) < self.edge_threshold
+        return [(float(x), float(y), float(r)) for (x, y, r), is_black in zip(circles, edge_dark)
+                if is_black and (self.center_grid is None
+                                 or is_center_region(x, y, w, h, self.center_grid))]
+
+    def black_edge_scores(self, gray, circles):
+        """批量计算各候选圆圆周（edge_thickness 像素宽）的平均灰度"""
+        return verify_circles(gray, circles, thickness=self.edge_thickness, fit=False)["mean"]
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圆环 ROI 跟踪
+
+目标圆环在相邻两次检测之间几乎不动。检测可信后，下一次只在上次圆
+周围的 ROI 内、上次半径附近的窄半径带里做霍夫；未命中或连续跟踪
+若干帧后回退全图搜索。
+"""
+
+import threading
+
+SEARCH_FULL = "full"
+SEARCH_ROI = "roi"
+
+
+class CircleTracker:
+    def __init__(self, enabled=True, roi_pad=0.35, radius_band=0.15,
+                 min_pad=40, refresh_every=30):
+        self.enabled = enabled
+        self.roi_pad = roi_pad              # ROI 在圆外额外留的边（相对半径）
+        self.radius_band = radius_band      # 半径搜索带（相对上次半径 ±）
+        self.min_pad = min_pad              # ROI 最小留边（像素）
+        self.refresh_every = refresh_every  # 连续跟踪多少次后强制全图搜索一次
+
+        self._lock = threading.Lock()
+        self._last = None       # 上次可信的 (x, y, r)
+        self._since_full = 0
+
+    def plan(self, shape, min_radius, max_radius):
+        """
+        决定本次搜索区域
+        返回 (模式, (x0, y0, x1, y1), minRadius, maxRadius)
+        """
+        h, w = shape[:2]
+        with self._lock:
+            last = self._last
+            if not self.enabled or last is None or self._since_full >= self.refresh_every:
+                return SEARCH_FULL, (0, 0, w, h), min_radius, max_radius
+
+        x, y, r = last
+        lo = max(min_radius, int(r * (1 - self.radius_band)))
+        hi = min(max_radius, int(r * (1 + self.radius_band)) + 1)
+        if lo >= hi:
+            return SEARCH_FULL, (0, 0, w, h), min_radius, max_radius
+
+        reach = hi + max(self.min_pad, int(r * self.roi_pad))
+        x0, y0 = max(0, int(x - reach)), max(0, int(y - reach))
+        x1, y1 = min(w, int(x + reach) + 1), min(h, int(y + reach) + 1)
+        return SEARCH_ROI, (x0, y0, x1, y1), lo, hi
+
+    def update(self, mode, circle):
+        """记录本次结果：circle 为全图坐标的 (x, y, r) 或 None"""
+        with self._lock:
+            if circle is None:
+                # 跟丢：下一次回到全图搜索
+                self._last = None
+                self._since_full = 0
+                return
+            self._last = tuple(circle)
+            self._since_full = 0 if mode == SEARCH_FULL else self._since_full + 1
+
+    def reset(self):
+        with self._lock:
+            self._last = None
+            self._since_full = 0
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+调试图片后台写入
+
+检测线程只负责把图片交给队列，JPEG 编码和写盘都在后台线程完成，
+响应不再等待磁盘。支持采样（每 N 次 / 仅失败时）和按总大小、时长清理。
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+# 采样模式
+MODE_OFF = "off"                # 不保存（默认）
+MODE_ALWAYS = "always"          # 每次都保存
+MODE_EVERY_N = "every_n"        # 每 N 次检测保存一次
+MODE_ON_FAILURE = "on_failure"  # 仅检测失败时保存
+
+
+class DebugWriter:
+    def __init__(self, mode=MODE_OFF, every_n=10, directory="debug_images",
+                 max_queue=4, max_bytes=200 * 1024 * 1024, max_age=24 * 3600,
+                 jpeg_quality=90):
+        self.mode = mode
+        self.every_n = max(1, int(every_n))
+        self.directory = directory
+        self.max_bytes = max_bytes      # 目录总大小上限（字节）
+        self.max_age = max_age          # 文件最长保留时间（秒）
+        self.jpeg_quality = jpeg_quality
+
+        # 队列长度有限：满了直接丢弃，内存占用有上限
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dropped = 0
+        self.written = 0
+
+    @property
+    def enabled(self):
+        return self.mode != MODE_OFF
+
+    def should_save(self, success):
+        """根据采样模式判断本次是否保存"""
+        if self.mode == MODE_OFF:
+            return False
+        if self.mode == MODE_ON_FAILURE:
+            return not success
+        if self.mode == MODE_EVERY_N:
+            with self._lock:
+                self._count += 1
+                return self._count % self.every_n == 0
+        return True
+
+    def submit(self, images, success=True, tag=None):
+        """
+        提交一组调试图片，立即返回。
+        images: {名称: ndarray 或 返回 ndarray 的函数}，函数在后台线程里执行
+        ndarray 在这里拷贝一份（检测流水线的缓冲区会被下一次检测覆盖），
+        只有真正要保存的那一次才拷贝；函数里不要引用这类缓冲区
+        """
+        if not self.should_save(success):
+            return False
+        if self._queue.full():
+            self.dropped += 1
+            return False
+        if tag is None:
+            tag = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        images = {name: image.copy() if hasattr(image, "copy") and not callable(image) else image
+                  for name, image in images.items()}
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((tag, images))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # ---------- 后台线程 ----------
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._thread = threading.Thread(target=self._run, name="debug-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            tag, images = self._queue.get()
+            for name, img in images.items():
+                try:
+                    if callable(img):
+                        img = img()
+                    if img is None:
+                        continue
+                    ok, buf = cv2.imencode(".jpg", img, params)
+                    if not ok:
+                        continue
+                    path = os.path.join(self.directory, f"debug_{name}_{tag}.jpg")
+                    with open(path, "wb") as f:
+                        f.write(buf.tobytes())
+                    self.written += 1
+                except Exception as e:
+                    print(f"[调试] 保存 {name} 失败: {e}")
+            self._enforce_retention()
+
+    def _enforce_retention(self):
+        """删除过期文件；总大小超限时从最旧的开始删"""
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".jpg"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except FileNotFoundError:
+            return
+
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+检测参数配置（detect_profiles.json），支持热加载
+
+每个配置是一组 CircleEngine 参数（预处理方式、阈值、霍夫参数、半径范围），
+请求里用 {"cmd": "detect", "profile": "near"} 选择。内置三个配置对应原来
+三个脚本里写死的参数：
+    unv         unv_detect_server：阈值置白 + 高斯模糊，半径 210~450
+    black_edge  rtsp_unv：中值模糊 + 暗区 + 腐蚀 + 黑边验证，半径 10~900
+    largest     detecet_cycle：高斯模糊 + 霍夫取最大圆，半径 50~500
+配置文件里同名配置覆盖内置值，"base" 指定从哪个配置继承。
+
+文件修改后下一次取配置时自动重新加载（最多每 check_interval 秒检查一次
+修改时间），不用重启服务、不断开 RTSP。每个配置只编译一次：结构元素、
+高斯核尺寸、半径范围都在创建 CircleEngine 时算好，之后直接复用；圆周采样表
+由 ring_verify.ring_offsets 按半径缓存。文件有错时保留上一版配置。
+"""
+
+import json
+import os
+import threading
+from collections import namedtuple
+
+from circle_engine import CircleEngine
+from circle_tracker import CircleTracker
+from hot_reload import HotReloadFile
+from single_flight import FrameSingleFlight
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detect_profiles.json")
+
+DEFAULT_PROFILES = {
+    "unv": {
+        "prefilter": "clip", "clip_thresh": 50, "gauss_ksize": 9, "gauss_sigma": 2,
+        "dp": 1.2, "min_dist": 200, "param1": 100, "param2": 120,
+        "min_radius": 210, "max_radius": 450, "pyramid_levels": "auto",
+        "edge_threshold": None,
+    },
+    "black_edge": {
+        "prefilter": "dark", "blur_ksize": 5, "dark_thresh": 25,
+        "erode_kernel": [1, 1], "erode_iterations": 4,
+        "dp": 1.4, "min_dist": 150, "param1": 100, "param2": 50,
+        "min_radius": 10, "max_radius": 900, "pyramid_levels": 0,
+        "edge_threshold": 55, "edge_thickness": 3,
+    },
+    "largest": {
+        "prefilter": "blur", "gauss_ksize": 9, "gauss_sigma": 2,
+        "dp": 1.2, "min_dist": 100, "param1": 100, "param2": 40,
+        "min_radius": 50, "max_radius": 500, "pyramid_levels": 0,
+        "edge_threshold": None,
+    },
+}
+
+# 编译后的配置：名称、参数（已展开继承）、引擎、版本号（每次重新加载 +1）
+Profile = namedtuple("Profile", ["name", "params", "engine", "version"])
+
+
+def resolve_profiles(raw):
+    """展开 "base" 继承，返回 {名称: 参数字典}"""
+    resolved = {}
+
+    def resolve(name, chain=()):
+        if name in resolved:
+            return resolved[name]
+        if name in chain:
+            raise ValueError(f"配置继承成环: {' -> '.join(chain + (name,))}")
+        if name not in raw:
+            raise ValueError(f"未知配置: {name}")
+        params = dict(raw[name])
+        base = params.pop("base", None)
+        if base is not None:
+            params = dict(resolve(base, chain + (name,)), **params)
+        resolved[name] = params
+        return params
+
+    for name in raw:
+        resolve(name)
+    return resolved
+
+
+def compile_profiles(raw, version):
+    """参数字典 → {名称: Profile}，任何一个配置有错都抛 ValueError"""
+    profiles = {}
+    for name, params in resolve_profiles(raw).items():
+        try:
+            engine = CircleEngine(**params)
+        except TypeError as e:
+            raise ValueError(f"配置 {name} 参数错误: {e}")
+        profiles[name] = Profile(name, params, engine, version)
+    return profiles
+
+
+class ProfileStore(HotReloadFile):
+    label = "配置"
+
+    def __init__(self, path=PROFILES_FILE, check_interval=1.0):
+        super().__init__(path, check_interval)
+
+    def load(self, mtime):
+        raw = dict(DEFAULT_PROFILES)
+        if mtime is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw.update(json.load(f).get("profiles", {}))
+        return compile_profiles(raw, self.version + 1)
+
+    def fallback(self):
+        return compile_profiles(DEFAULT_PROFILES, self.version + 1)
+
+    def describe(self, profiles):
+        return ", ".join(sorted(profiles))
+
+    def get(self, name):
+        """取编译好的配置，未知名称抛 KeyError"""
+        self.maybe_reload()
+        return self.value[name]
+
+    def has(self, name):
+        self.maybe_reload()
+        return name in self.value
+
+    def names(self):
+        self.maybe_reload()
+        return sorted(self.value)
+
+    def info(self):
+        """profiles 命令的响应内容"""
+        self.maybe_reload()
+        return {
+            "version": self.version,
+            "profiles": {name: profile.params for name, profile in sorted(self.value.items())},
+            "last_error": self.last_error,
+        }
+
+
+class ProfileDetector:
+    """
+    一路视频上的检测：每个配置各自保留跟踪状态和按帧合并，
+    同一帧用不同配置检测互不影响
+    """
+
+    def __init__(self, store, default, tracking=True, refresh_every=30):
+        self.store = store
+        self.default = default
+        self.tracking = tracking
+        self.refresh_every = refresh_every
+        self._lock = threading.Lock()
+        self._state = {}    # 配置名 → (CircleTracker, FrameSingleFlight)
+
+    def _get_state(self, name):
+        with self._lock:
+            state = self._state.get(name)
+            if state is None:
+                tracker = CircleTracker(enabled=self.tracking, refresh_every=self.refresh_every)
+                state = self._state[name] = (tracker, FrameSingleFlight())
+            return state
+
+    def reset(self):
+        """清空所有跟踪状态（跟踪开关改变后调用）"""
+        with self._lock:
+            self._state.clear()
+
+    def compute(self, image, profile=None, debug=False, band=None):
+        """直接检测一帧（不合并），返回 DetectResult；未知配置抛 KeyError"""
+        name = profile or self.default
+        engine = self.store.get(name).engine
+        tracker, _ = self._get_state(name)
+        return engine.detect(image, tracker, debug=debug, band=band)
+
+    def run(self, seq, image, profile=None, debug=False, band=None):
+        """
+        同一帧同一配置的并发请求只算一次，返回 (DetectResult, 是否复用, 配置名)
+        带半径带（radius_band）的请求搜索范围各不相同，单独计算不合并
+        """
+        name = profile or self.default
+        engine = self.store.get(name).engine
+        tracker, flight = self._get_state(name)
+        if band is not None:
+            return engine.detect(image, tracker, debug=debug, band=band), False, name
+        result, shared = flight.run(seq, lambda: engine.detect(image, tracker, debug=debug))
+        return result, shared, name
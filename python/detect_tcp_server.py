@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圆检测 TCP 命令服务（asyncio 实现）
+
+协议：每行一个 JSON 命令，每个命令回复一行 JSON。
+    {"cmd": "detect"}  → 执行检测
+    {"cmd": "ping"}    → 测试连接
+    {"cmd": "subscribe", "max_fps": 5} → 持续推送每帧检测结果（需服务端启用）
+    {"cmd": "unsubscribe"}             → 停止推送
+    {"cmd": "stats"}   → 各阶段延迟的 p50/p95/p99（需设置 server.stats）
+其它命令回复 unknown_command，非法 JSON 回复 invalid_json。
+
+订阅推送：一个发布任务对实时帧连续检测（不超过 max_rate），每帧结果
+只算一次、推给所有订阅者；订阅者发送缓冲未清空时直接丢弃该帧，不排队。
+
+所有连接共用一个事件循环线程；检测等耗 CPU 的命令交给线程池执行，
+OpenCV 计算时会释放 GIL，少量线程即可服务大量 PLC / Node-RED 连接。
+unv_detect_server.py 和 rtsp_unv.py 共用这一实现。
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def encode_line(obj):
+    """JSON 对象 → 一行 UTF-8 字节"""
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def error_response(error, message, cmd_name=None):
+    response = {"success": False, "error": error}
+    if cmd_name is not None:
+        response["cmd"] = cmd_name
+    response["message"] = message
+    response["timestamp"] = datetime.now().isoformat()
+    return response
+
+
+PUBLISH_BACKOFF_MIN = 0.5     # 订阅推送检测出错后的重试退避（秒）
+PUBLISH_BACKOFF_MAX = 10
+
+
+class DetectTCPServer:
+    def __init__(self, host, port, workers=2, idle_timeout=300,
+                 max_line=64 * 1024, write_high_water=256 * 1024, write_timeout=10):
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout            # 连接空闲多久断开（秒）
+        self.max_line = max_line                    # 单条命令最大字节数
+        self.write_high_water = write_high_water    # 发送缓冲高水位（字节）
+        self.write_timeout = write_timeout          # 对端不读数据时最多等多久（秒）
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detect")
+        self._handlers = {}
+        self._aliases = {}
+        self.ping_info = None       # 可选：返回附加到 ping 响应里的字典
+        self.stats = None           # 可选：timing.LatencyStats，启用 stats 命令并记录排队/编码耗时
+        self.loop = None
+        self._server = None
+        self.clients = 0
+
+        # 订阅推送
+        self._next_result = None
+        self.max_rate = 10
+        self._subscribers = {}
+        self._publisher = None
+        self._publish_executor = None
+
+    # ---------- 命令注册 ----------
+    def register(self, name, handler, aliases=(), blocking=True):
+        """
+        注册命令处理函数 handler(cmd) -> dict
+        blocking=True 时在线程池中执行，否则直接在事件循环里执行（必须很快）
+        """
+        self._handlers[name] = (handler, blocking)
+        for alias in aliases:
+            self._aliases[alias] = name
+
+    def enable_subscribe(self, next_result, max_rate=10):
+        """
+        启用 subscribe 命令
+        next_result(last_seq) -> (seq, 响应字典) 或 None：阻塞等待比 last_seq 更新的帧
+        并返回其检测结果（超时返回 None），在独立线程中调用
+        max_rate: 每秒最多检测/推送几帧
+        """
+        self._next_result = next_result
+        self.max_rate = max_rate
+        self._publish_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="publish")
+
+    def _ping(self, cmd):
+        response = {
+            "success": True,
+            "cmd": "ping",
+            "message": "pong",
+        }
+        if self.ping_info is not None:
+            response.update(self.ping_info())
+        if self._next_result is not None:
+            response["subscribers"] = len(self._subscribers)
+        response["timestamp"] = datetime.now().isoformat()
+        return response
+
+    def _stats(self, cmd):
+        if cmd.get("reset"):
+            self.stats.reset()
+            stages = {}
+        else:
+            stages = self.stats.snapshot()
+        return {
+            "success": True,
+            "cmd": "stats",
+            "window": self.stats.window,
+            "stages": stages,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def _timed(self, handler, cmd, queued_at):
+        """线程池里执行 handler，顺便记录在线程池里排队的时间"""
+        self.stats.add("queue", (time.perf_counter() - queued_at) * 1000)
+        return handler(cmd)
+
+    async def dispatch(self, cmd):
+        """执行一条已解析的命令，返回响应字典"""
+        cmd_name = str(cmd.get("cmd", "")).strip().lower()
+        cmd_name = self._aliases.get(cmd_name, cmd_name)
+
+        if cmd_name == "ping" and "ping" not in self._handlers:
+            return self._ping(cmd)
+        if cmd_name == "stats" and "stats" not in self._handlers and self.stats is not None:
+            return self._stats(cmd)
+
+        entry = self._handlers.get(cmd_name)
+        if entry is None:
+            return error_response("unknown_command", f"未知命令: {cmd_name}", cmd_name)
+
+        handler, blocking = entry
+        try:
+            if blocking:
+                if self.stats is not None:
+                    return await self.loop.run_in_executor(
+                        self.executor, self._timed, handler, cmd, time.perf_counter())
+                return await self.loop.run_in_executor(self.executor, handler, cmd)
+            return handler(cmd)
+        except Exception as e:
+            print(f"[错误] 执行 {cmd_name} 失败: {e}")
+            return error_response("internal_error", str(e), cmd_name)
+
+    # ---------- 订阅推送 ----------
+    def _subscribe(self, cmd, writer):
+        if self._next_result is None:
+            return error_response("unknown_command", "未启用订阅", "subscribe")
+        try:
+            max_fps = float(cmd.get("max_fps", self.max_rate))
+        except (TypeError, ValueError):
+            return error_response("invalid_param", "max_fps 必须是数字", "subscribe")
+        max_fps = min(max(max_fps, 0.1), self.max_rate)
+        self._subscribers[writer] = {"min_interval": 1.0 / max_fps, "last_sent": 0.0,
+                                     "sent": 0, "dropped": 0}
+        if self._publisher is None:
+            self._publisher = self.loop.create_task(self._publish_loop())
+        return {
+            "success": True,
+            "cmd": "subscribe",
+            "max_fps": max_fps,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def _unsubscribe(self, writer):
+        sub = self._subscribers.pop(writer, None)
+        response = {
+            "success": True,
+            "cmd": "unsubscribe",
+            "subscribed": sub is not None,
+        }
+        if sub is not None:
+            response["sent"] = sub["sent"]
+            response["dropped"] = sub["dropped"]
+        response["timestamp"] = datetime.now().isoformat()
+        return response
+
+    async def _publish_loop(self):
+        """
+        只要还有订阅者，就对每个新帧检测一次并推送给所有订阅者
+        单次检测出错（配置热加载后的参数错误等）不结束推送：给订阅者推一条
+        错误事件，退避后继续
+        """
+        interval = 1.0 / self.max_rate
+        last_seq = 0
+        backoff = PUBLISH_BACKOFF_MIN
+        try:
+            while self._subscribers:
+                started = time.monotonic()
+                try:
+                    item = await self.loop.run_in_executor(
+                        self._publish_executor, self._next_result, last_seq)
+                except Exception as e:
+                    print(f"[错误] 订阅推送 -> {e!r}，{backoff:.1f}s 后重试")
+                    self._broadcast(encode_line(dict(
+                        error_response("detect_failed", f"{type(e).__name__}: {e}"), event="detect")),
+                        force=True)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, PUBLISH_BACKOFF_MAX)
+                    continue
+                backoff = PUBLISH_BACKOFF_MIN
+                if item is None:
+                    continue
+                last_seq, result = item
+                self._broadcast(encode_line(dict(result, event="detect")))
+
+                delay = interval - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            self._publisher = None
+
+    def _broadcast(self, line, force=False):
+        """推给各订阅者；force 为 True 时不受订阅频率限制（错误事件）"""
+        now = time.monotonic()
+        for writer, sub in list(self._subscribers.items()):
+            if writer.is_closing():
+                self._subscribers.pop(writer, None)
+                continue
+            if not force and now - sub["last_sent"] < sub["min_interval"]:
+                continue
+            # 上一条还没发出去：慢消费者，丢弃本帧而不是排队
+            if writer.transport.get_write_buffer_size() > 0:
+                sub["dropped"] += 1
+                continue
+            writer.write(line)
+            sub["last_sent"] = now
+            sub["sent"] += 1
+
+    # ---------- 连接处理 ----------
+    async def _send(self, writer, obj, stage=None):
+        if stage is not None and self.stats is not None:
+            t0 = time.perf_counter()
+            line = encode_line(obj)
+            self.stats.add(stage, (time.perf_counter() - t0) * 1000)
+        else:
+            line = encode_line(obj)
+        writer.write(line)
+        # 发送缓冲超过高水位时等待对端读走，对端长时间不读则断开
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        writer.transport.set_write_buffer_limits(high=self.write_high_water)
+        self.clients += 1
+        print(f"[连接] {addr}")
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readuntil(b"\n"), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if writer in self._subscribers:
+                        # 订阅者只收不发，不算空闲
+                        continue
+                    print(f"[超时] {addr} 空闲超过 {self.idle_timeout}s")
+                    break
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, error_response(
+                        "line_too_long", f"单条命令超过 {self.max_line} 字节"))
+                    break
+
+                message = line.decode("utf-8", errors="replace").strip()
+                if not message:
+                    continue
+
+                print(f"[收到] {addr} -> {message}")
+
+                # 解析 JSON 命令
+                try:
+                    cmd = json.loads(message)
+                    if not isinstance(cmd, dict):
+                        raise json.JSONDecodeError("命令必须是 JSON 对象", message, 0)
+                except json.JSONDecodeError as e:
+                    await self._send(writer, error_response("invalid_json", f"JSON 解析失败: {e}"))
+                    continue
+
+                # 同一连接上的命令按顺序执行，读下一条之前先把响应发出去
+                cmd_name = str(cmd.get("cmd", "")).strip().lower()
+                if cmd_name == "subscribe":
+                    response = self._subscribe(cmd, writer)
+                elif cmd_name == "unsubscribe":
+                    response = self._unsubscribe(writer)
+                else:
+                    response = await self.dispatch(cmd)
+                # 只统计注册命令（detect 等）响应的 JSON 编码耗时
+                registered = self._aliases.get(cmd_name, cmd_name) in self._handlers
+                await self._send(writer, response, "encode" if registered else None)
+                print(f"[响应] {addr} -> {json.dumps(response, ensure_ascii=False)[:100]}...")
+
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            print(f"[错误] {addr} -> {e!r}")
+        finally:
+            self.clients -= 1
+            self._subscribers.pop(writer, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            print(f"[断开] {addr}")
+
+    # ---------- 启动 ----------
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(
+            self.handle_client, self.host, self.port,
+            limit=self.max_line, reuse_address=True)
+        print(f"[服务启动] 监听 {self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    def serve_forever(self):
+        """在当前线程运行（阻塞）"""
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            print("\n[停止] 服务关闭")
+        finally:
+            self.executor.shutdown(wait=False)
+            if self._publish_executor is not None:
+                self._publish_executor.shutdown(wait=False)
+
+    def start_in_thread(self):
+        """在后台线程运行，适合带 GUI 的程序"""
+        thread = threading.Thread(target=self.serve_forever, name="detect-tcp", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        if self.loop is not None and self._server is not None:
+            self.loop.call_soon_threadsafe(self._server.close)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+廉价的坏帧检查（所有抓帧路径共用）
+
+刚连上流或丢包时解码器会吐出全黑帧、纯灰帧，或者关键帧只解出上半截、
+下半截是花屏拖影。这些帧送进霍夫只会浪费时间、给出错误结果。检查只看
+跨步采样的亮度（BGR 取绿色通道，WebRTC 直接取 YUV 的 Y 平面，不做颜色
+转换），1080p 默认 8 像素跨步只看约 3 万个像素，正常帧几乎没有额外开销：
+
+    black     平均亮度过低
+    uniform   整帧几乎没有起伏（纯灰/纯色）
+    smeared   底部连续一段逐行不变，而且就是上面最后一行正常画面的重复
+              （解码出错时最后解出的一行被向下拖）
+
+底部本来就平的画面（过曝区域、墙面、黑色垫板）逐行也不变，但和上方画面
+接不上（不是同一行的重复），或者被“重复”的那一行本身就是平的（无从区分，
+按正常处理），都不算拖影。
+
+check_frame() 返回 None 表示正常，否则返回原因。检查难免误判，调用方用
+FrameGate 计数：坏帧先丢掉等下一帧，连续 MAX_REJECTS 帧都判坏时照常放行，
+帧上带 suspect（原因），不会因为误判把流完全卡住。
+"""
+
+import time
+
+import numpy as np
+
+STRIDE = 8              # 采样跨步（像素）
+BLACK_MEAN = 10         # 平均亮度低于此值算黑帧
+UNIFORM_STD = 2.0       # 采样亮度标准差低于此值算纯色帧
+SMEAR_BANDS = 16        # 拖影检查把画面分成多少条横带
+SMEAR_FRACTION = 0.25   # 底部坏带至少占画面高度的比例
+SMEAR_ROW_DIFF = 0.1    # 横带内相邻采样行平均差低于此值算“逐行不变”（拖影几乎完全相同；
+                        # 很暗的正常画面也在 0.2 以上）
+SMEAR_REPEAT_DIFF = 2.0 # 坏带各行和上方最后一行正常画面的平均差低于此值算“重复”
+MAX_REJECTS = 25        # 连续判坏这么多帧后放行（标记 suspect），约 1~2 秒的视频
+
+REASON_BLACK = "black"
+REASON_UNIFORM = "uniform"
+REASON_SMEARED = "smeared"
+
+
+def luma_sample(image, stride=STRIDE):
+    """BGR/灰度图 → 跨步采样的亮度近似（视图，不拷贝；BGR 取绿色通道）"""
+    if image.ndim == 3:
+        return image[::stride, ::stride, 1]
+    return image[::stride, ::stride]
+
+
+def y_plane(frame):
+    """av.VideoFrame（yuv420p/nv12 等）→ Y 平面 ndarray 视图，不做颜色转换"""
+    plane = frame.planes[0]
+    rows = np.frombuffer(plane, np.uint8).reshape(-1, plane.line_size)
+    return rows[:frame.height, :frame.width]
+
+
+def check_luma(luma):
+    """对亮度采样做检查，返回 None 或原因"""
+    if luma.size == 0:
+        return REASON_UNIFORM
+    sample = luma.astype(np.int16)
+    if sample.mean() < BLACK_MEAN:
+        return REASON_BLACK
+    if sample.std() < UNIFORM_STD:
+        return REASON_UNIFORM
+
+    # 拖影：从底部往上数，逐行不变（或横带内纯色）的横带
+    rows = sample.shape[0]
+    bands = min(SMEAR_BANDS, rows // 2)
+    if bands < 2:
+        return None
+    row_diff = np.abs(np.diff(sample, axis=0)).mean(axis=1)    # 相邻采样行的差
+    edges = np.linspace(0, rows, bands + 1).astype(int)
+    dead = 0
+    for b in range(bands - 1, -1, -1):
+        lo, hi = edges[b], edges[b + 1]
+        if hi - lo < 2:
+            break
+        if row_diff[lo:hi - 1].mean() < SMEAR_ROW_DIFF:
+            dead += 1
+        else:
+            break
+    if not (dead and dead < bands and dead / bands >= SMEAR_FRACTION):
+        return None
+    # 拖影是上方最后一行的重复；底部本来就平的画面和上方接不上
+    top = edges[bands - dead]
+    source = sample[top - 1]
+    if source.std() < UNIFORM_STD:
+        return None     # 被重复的一行本身就是平的，和平整的底部区分不开
+    if np.abs(sample[top:] - source).mean() < SMEAR_REPEAT_DIFF:
+        return REASON_SMEARED
+    return None
+
+
+class FrameGate:
+    """
+    连续坏帧计数：坏帧丢掉，连续超过 max_rejects 帧都判坏时放行（suspect 为原因），
+    直到下一帧正常为止
+    """
+
+    def __init__(self, max_rejects=MAX_REJECTS):
+        self.max_rejects = max_rejects
+        self.rejected = 0           # 累计丢弃的帧数
+        self.last_reject = None
+        self._streak = 0
+
+    def admit(self, reason):
+        """reason 为 check_* 的结果，返回 (是否使用这一帧, suspect)"""
+        if reason is None:
+            self._streak = 0
+            return True, None
+        self.last_reject = reason
+        self._streak += 1
+        if self._streak > self.max_rejects:
+            return True, reason
+        self.rejected += 1
+        return False, None
+
+
+def frame_status(frame, now=None):
+    """响应里附带的帧状态：帧龄（毫秒）和 suspect（放行的疑似坏帧的原因，正常为 None）"""
+    now = time.time() if now is None else now
+    return {"frame_age_ms": round((now - frame.timestamp) * 1000, 1),
+            "suspect": getattr(frame, "suspect", None)}
+
+
+def check_frame(image, stride=STRIDE):
+    """BGR/灰度图的坏帧检查，返回 None（正常）或 black / uniform / smeared"""
+    return check_luma(luma_sample(image, stride))
+
+
+def check_av_frame(frame, stride=STRIDE):
+    """WebRTC 解码帧（av.VideoFrame）的坏帧检查，直接看 Y 平面"""
+    return check_luma(y_plane(frame)[::stride, ::stride])
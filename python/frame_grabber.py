@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+常驻 RTSP 抓帧服务
+
+后台线程始终连着 RTSP 流，只保留最新一帧（附带时间戳和序号），
+断流后按指数退避重连。调用方通过 latest() 借用最新帧，不会阻塞。
+
+按需解码模式（on_demand=True）：只在有人调用 wait_frame()/request() 要帧
+之后，或到了预览间隔（preview_fps）时才产出 BGR 帧。两种实现：
+- PyAV（装了 av 时默认）：后台只解复用，把最近一个关键帧起的压缩包缓存
+  起来（一个 GOP）；要帧时把还没解码的包一次解完，只把最后一帧转 BGR。
+  空闲时 CPU 开销就是解复用；要帧的延迟是补解半个 GOP 左右（1080p H.264、
+  GOP 50 时约几十毫秒）。积压超过 MAX_BACKLOG 个包时先解掉，延迟有上限
+- OpenCV（没有 av 时）：对每个包 grab()、要帧时才 retrieve()。OpenCV 的
+  FFmpeg 后端在 grab() 里就已经解码，省下的只是 BGR 转换和拷贝（实测
+  H.264 约 10%，MPEG-4 约 40%），不是只做解复用
+
+解码出的帧先过 frame_check 的检查（跨步采样亮度，约 0.5 ms；PyAV 直接看
+YUV 的 Y 平面，判坏的帧不做 BGR 转换）：黑帧、
+纯色帧、底部拖影的帧不发布，按需模式下继续解码下一帧。连续 MAX_REJECTS 帧
+都判坏时（多半是误判，或者镜头真的被挡）照常发布，Frame.suspect 带上原因。
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+from frame_check import FrameGate, check_av_frame, check_frame
+
+try:
+    import av
+except ImportError:     # 没装 PyAV 时按需模式退回 OpenCV 的 grab/retrieve
+    av = None
+
+# 强制使用 TCP 传输
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
+
+# 一帧数据：图像、采集时间（time.time()）、序号（从 1 开始递增）、
+# suspect（连续判坏后放行的帧为判坏原因，正常为 None）
+Frame = namedtuple("Frame", ["image", "timestamp", "seq", "suspect"], defaults=(None,))
+
+BACKEND_AV = "av"
+BACKEND_OPENCV = "opencv"
+MAX_BACKLOG = 100       # PyAV 按需模式：未解码的包积压超过这个数就先解掉（没有关键帧的长 GOP）
+AV_TIMEOUT = (10, 5)    # PyAV 打开/读包超时（秒）
+
+
+class FrameGrabber:
+    def __init__(self, rtsp_url, name="grabber",
+                 reconnect_min=0.5, reconnect_max=10.0, read_fail_limit=50, on_frame=None,
+                 on_demand=False, preview_fps=0, validate=True, backend=None):
+        self.rtsp_url = rtsp_url
+        self.name = name
+        self.on_frame = on_frame                # 可选：每解码一帧回调 on_frame(Frame)
+        self.reconnect_min = reconnect_min      # 首次重连等待（秒）
+        self.reconnect_max = reconnect_max      # 重连等待上限（秒）
+        self.read_fail_limit = read_fail_limit  # 连续读帧失败多少次视为断流
+        self.on_demand = on_demand              # 按需解码：只在有人要帧/到预览间隔时解码
+        self.preview_interval = 1.0 / preview_fps if preview_fps > 0 else None
+        self.validate = validate                # 丢弃黑帧/纯色帧/拖影帧
+        # 按需模式默认用 PyAV（空闲只解复用），连续解码模式用 OpenCV
+        if backend is None:
+            backend = BACKEND_AV if on_demand and av is not None else BACKEND_OPENCV
+        if backend == BACKEND_AV and av is None:
+            raise ImportError("backend='av' 需要安装 PyAV")
+        self.backend = backend
+
+        self._latest = None
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._grabbed = 0
+        self._decoded = 0
+        self._demand = False
+        self._gate = FrameGate()
+        self._running = False
+        self._thread = None
+
+        # 健康状态
+        self._connected = False
+        self._had_data = False      # 本次连接是否收到过数据（决定是否重置重连退避）
+        self._reconnects = 0
+        self._last_error = None
+        self._started_at = None
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ---------- 读取 ----------
+    def latest(self):
+        """返回最新一帧 Frame，没有则返回 None（不阻塞）"""
+        return self._latest
+
+    def request(self):
+        """请求解码下一帧（按需解码模式下才有意义，非阻塞）"""
+        self._demand = True
+
+    def wait_frame(self, timeout=10.0, newer_than=0):
+        """等待序号大于 newer_than 的帧，超时返回 None（按需解码模式下会请求解码）"""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._demand = True
+            while self._running:
+                frame = self._latest
+                if frame is not None and frame.seq > newer_than:
+                    return frame
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return None
+
+    def health(self):
+        """流健康状态，用于 ping 响应"""
+        frame = self._latest
+        now = time.time()
+        return {
+            "connected": self._connected,
+            "frames": self._seq,
+            "grabbed": self._grabbed,
+            "decoded": self._decoded,
+            "backend": self.backend,
+            "rejected": self._gate.rejected,
+            "last_reject": self._gate.last_reject,
+            "on_demand": self.on_demand,
+            "last_frame_age_ms": round((now - frame.timestamp) * 1000, 1) if frame else None,
+            "reconnects": self._reconnects,
+            "last_error": self._last_error,
+            "uptime_s": round(now - self._started_at, 1) if self._started_at else 0,
+        }
+
+    # ---------- 后台线程 ----------
+    def _open(self):
+        cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _publish(self, image, suspect=None):
+        with self._cond:
+            self._seq += 1
+            frame = Frame(image, time.time(), self._seq, suspect)
+            self._latest = frame
+            self._cond.notify_all()
+        if self.on_frame is not None:
+            self.on_frame(frame)
+
+    def _want_frame(self, now, last_decode):
+        """按需解码模式下，这个包是否需要解码"""
+        if self._demand:
+            return True
+        return self.preview_interval is not None and now - last_decode >= self.preview_interval
+
+    def _accept(self, reason, convert, demanded):
+        """
+        按检查结果（check_* 的返回值）发布解码出的一帧；convert() 返回 BGR 图，
+        只对放行的帧调用。坏帧不发布，有人在等帧时要求再解下一帧
+        """
+        suspect = None
+        if self.validate:
+            use, suspect = self._gate.admit(reason)
+            if not use:
+                # 预览解码的坏帧直接跳过，持续坏帧时最多连解 MAX_REJECTS 帧就放行
+                if demanded:
+                    self._demand = True
+                return
+        self._publish(convert(), suspect)
+
+    def _run(self):
+        backoff = self.reconnect_min
+        session = self._session_av if self.backend == BACKEND_AV else self._session_opencv
+        while self._running:
+            self._had_data = False
+            opened = session()
+            self._connected = False
+            if not self._running:
+                break
+            if self._had_data:
+                backoff = self.reconnect_min
+            if opened:
+                print(f"[抓帧] {self.name} 流中断（{self._last_error}），{backoff:.1f}s 后重连")
+            else:
+                print(f"[抓帧] {self.name} 打开 RTSP 失败，{backoff:.1f}s 后重试")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.reconnect_max)
+            self._reconnects += 1
+
+    def _mark_data(self):
+        if not self._connected:
+            self._connected = True
+            self._had_data = True
+
+    def _session_opencv(self):
+        """OpenCV 读流，直到断流返回；打不开返回 False"""
+        cap = self._open()
+        if cap is None:
+            self._last_error = "open_failed"
+            return False
+        print(f"[抓帧] {self.name} 已连接 {self.rtsp_url}")
+        fails = 0
+        last_decode = 0.0
+        try:
+            while self._running:
+                demanded = False
+                if self.on_demand:
+                    # 每个包都 grab，保持缓冲为空；只有需要时才转换（grab 内部已经解码）
+                    ret, image = cap.grab(), None
+                    if ret:
+                        self._grabbed += 1
+                        now = time.time()
+                        if self._want_frame(now, last_decode):
+                            demanded, self._demand = self._demand, False
+                            ret, image = cap.retrieve()
+                            last_decode = now
+                else:
+                    ret, image = cap.read()
+                    if ret:
+                        self._grabbed += 1
+                if not ret:
+                    fails += 1
+                    if fails >= self.read_fail_limit:
+                        self._last_error = "read_failed"
+                        break
+                    time.sleep(0.01)
+                    continue
+                fails = 0
+                self._mark_data()
+                if image is not None:
+                    self._decoded += 1
+                    reason = check_frame(image) if self.validate else None
+                    self._accept(reason, lambda: image, demanded)
+        finally:
+            cap.release()
+        return True
+
+    @staticmethod
+    def _check_av(frame):
+        """PyAV 解码帧的检查；不是平面 YUV 的格式（少见）才先转 BGR"""
+        if frame.format.name.startswith(("yuv", "nv")):
+            return check_av_frame(frame)
+        return check_frame(frame.to_ndarray(format="bgr24"))
+
+    def _session_av(self):
+        """
+        PyAV 读流：只解复用并缓存当前 GOP 的包，要帧时才解码，直到断流返回
+        打不开返回 False
+        """
+        try:
+            container = av.open(self.rtsp_url, options={"rtsp_transport": "tcp"}, timeout=AV_TIMEOUT)
+        except (av.error.FFmpegError, OSError) as e:
+            self._last_error = f"open_failed: {e}"
+            return False
+        print(f"[抓帧] {self.name} 已连接 {self.rtsp_url}（PyAV）")
+        try:
+            stream = container.streams.video[0]
+            codec = stream.codec_context
+            codec.thread_type = "SLICE"     # 帧级多线程会让解码器多压几帧，要帧时拿不到最新一帧
+            gop = []            # 最近一个关键帧起的包
+            fed = 0             # gop 里已经送进解码器的包数
+            last_decode = 0.0
+            for packet in container.demux(stream):
+                if not self._running:
+                    break
+                if packet.size == 0:
+                    continue    # 流结束的空包
+                self._grabbed += 1
+                self._mark_data()
+                if packet.is_keyframe:
+                    gop, fed = [packet], 0
+                elif gop:
+                    gop.append(packet)
+                else:
+                    continue    # 还没等到第一个关键帧，单独的 P 帧解不出来
+                now = time.time()
+                wanted = self._want_frame(now, last_decode)
+                demanded = False
+                if wanted:
+                    demanded, self._demand = self._demand, False
+                    last_decode = now
+                elif len(gop) - fed <= MAX_BACKLOG:
+                    continue
+                # 补解积压的包，只保留最后一帧
+                frame = None
+                for pending in gop[fed:]:
+                    for decoded in codec.decode(pending):
+                        frame = decoded
+                fed = len(gop)
+                if not wanted:
+                    continue
+                if frame is None:
+                    # 解码器还压着帧（有 B 帧时），下一个包再试
+                    if demanded:
+                        self._demand = True
+                    continue
+                self._decoded += 1
+                # 先看 Y 平面（RTSP 的 H.264/H.265 都是 YUV），放行的帧才转 BGR
+                reason = self._check_av(frame) if self.validate else None
+                self._accept(reason, lambda: frame.to_ndarray(format="bgr24"), demanded)
+            self._last_error = "end_of_stream"
+        except (av.error.FFmpegError, OSError) as e:
+            self._last_error = f"read_failed: {e}"
+        finally:
+            container.close()
+        return True
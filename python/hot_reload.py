@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按修改时间轮询的配置文件热加载
+
+检测配置（detect_profiles.json）、镜头标定（calibration.json）、半径标定
+（radius_calibration.json）都是同一套做法：
+- 每次取值前最多每 check_interval 秒 stat 一次文件，修改时间变了就重新加载
+- 加载出错时保留上一版继续服务，错误记在 last_error，诊断信息打到标准错误
+  （detecet_cycle 这类命令行工具的标准输出只能是 JSON）
+
+子类实现 load(mtime)（mtime 为 None 表示文件不存在），出错抛 errors 里的
+异常；首次加载就失败时用 fallback() 的结果。加载好的内容在 self.value。
+
+    class ProfileStore(HotReloadFile):
+        label = "配置"
+        def load(self, mtime): ...
+"""
+
+import os
+import sys
+import threading
+import time
+
+
+class HotReloadFile:
+    label = "配置"                  # 诊断信息前缀
+    errors = (OSError, ValueError)  # 视为文件内容有错的异常（json.JSONDecodeError 也是 ValueError）
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.last_error = None
+        self.value = None
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.reload(force=True)
+
+    def load(self, mtime):
+        """读取并解析文件，返回新内容；子类实现"""
+        raise NotImplementedError
+
+    def fallback(self):
+        """首次加载失败时使用的内容"""
+        return None
+
+    def describe(self, value):
+        """重新加载成功时打印的摘要"""
+        return ""
+
+    def reload(self, force=False):
+        """文件有变化（或 force）时重新加载，返回是否加载了新内容"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            self._checked = time.time()
+            if not force and mtime == self._mtime:
+                return False
+            self._mtime = mtime
+
+        try:
+            value = self.load(mtime)
+        except self.errors as e:
+            # 文件有错：保留上一版
+            self.last_error = str(e)
+            print(f"[{self.label}] 加载 {self.path} 失败，继续使用上一版: {e}", file=sys.stderr)
+            if self.value is None:
+                self.value = self.fallback()
+            return False
+
+        with self._lock:
+            self.value = value
+            self.version += 1
+            self.last_error = None
+        if self.version > 1:
+            print(f"[{self.label}] 已重新加载 v{self.version} {self.describe(value)}".rstrip(),
+                  file=sys.stderr)
+        return True
+
+    def maybe_reload(self):
+        if time.time() - self._checked >= self.check_interval:
+            self.reload()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JPEG/PNG 编码写盘线程池（有界队列）
+
+抓帧线程只负责解码，把图片交给队列就继续取下一帧；编码和写盘在工作线程
+里做（cv2.imencode 会释放 GIL，多个线程能并行）。队列满了直接丢弃这一帧
+并计数，不阻塞抓帧——连拍时宁可报告丢帧，也不能让 RTSP 缓冲积压。
+"""
+
+import os
+import queue
+import threading
+
+import cv2
+
+WORKERS = 2
+MAX_QUEUE = 8
+
+
+class ImageWriterPool:
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE, jpeg_quality=95, png_compression=1):
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression  # PNG 压缩级别，低一点编码快很多
+        # maxsize <= 0 在 queue.Queue 里是无界队列，会失去“满了丢帧”的保证
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = {}        # 路径 → 错误信息
+        self._threads = [threading.Thread(target=self._run, name=f"image-writer-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def params(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".png":
+            return ext, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        return ext or ".jpg", [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+
+    def submit(self, path, image):
+        """
+        提交一张图片，立即返回是否入队（队列满返回 False 并计为丢帧）
+        图片入队后不能再被修改（VideoCapture.read 每次返回新数组，可以直接交）
+        """
+        try:
+            self._queue.put_nowait((path, image))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def close(self):
+        """等队列里的图片都写完，停止工作线程"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, image = item
+            try:
+                ext, params = self.params(path)
+                ok, buf = cv2.imencode(ext, image, params)
+                if not ok:
+                    raise ValueError("编码失败")
+                with open(path, "wb") as f:
+                    f.write(buf.tobytes())
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed[path] = str(e)
+
+    def stats(self):
+        with self._lock:
+            return {"submitted": self.submitted, "written": self.written,
+                    "dropped": self.dropped, "failed": len(self.failed),
+                    "queued": self._queue.qsize()}
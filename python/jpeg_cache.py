@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按帧编码一次的 JPEG 缓存
+
+同一帧经常被好几个地方各自编码：快照服务的 /snapshot.jpg 和 /save、
+unv_save 转发、多相机服务的 snapshot 命令……多人同时预览/轮询时，重复的
+JPEG 编码是解码之后最大的 CPU 开销。
+
+缓存按 (相机, 帧序号, 质量, 缩放) 存编码结果（帧序号连同采集时间一起作为帧的
+标识：FrameGrabber 被回收重建、工作进程重启后序号会从 1 重新开始）：
+- 每种编码同一帧最多算一次；并发请求同一份编码时只有一个线程在编码，
+  其余等它的结果（同 single_flight 的做法）
+- 按总字节数做 LRU 淘汰，内存有上限
+
+帧是任何带 image/timestamp/seq 的对象（frame_grabber.Frame、frame_ring.RingFrame、
+unv_save_rtc.WHEPFrame）。
+
+    data = JPEG_CACHE.get("cam1", frame, quality=80, scale=0.5)
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cv2
+
+MAX_BYTES = 64 * 1024 * 1024    # 缓存总大小上限（字节）
+DEFAULT_QUALITY = 95            # 与 cv2.imwrite 的默认 JPEG 质量一致
+
+
+def encode(image, quality=DEFAULT_QUALITY, scale=1.0):
+    """BGR 图 → JPEG 字节；scale < 1 时先按比例缩小"""
+    if scale != 1.0:
+        h, w = image.shape[:2]
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("JPEG 编码失败")
+    return buf.tobytes()
+
+
+class JpegCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key → bytes，按最近使用排序
+        self._pending = {}              # key → Future，正在编码
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0                 # 实际编码次数
+        self.waits = 0                  # 等别的线程编码完成的次数
+        self.evictions = 0
+
+    @staticmethod
+    def key(camera, frame, quality=DEFAULT_QUALITY, scale=1.0):
+        return camera, (frame.seq, frame.timestamp), int(quality), round(float(scale), 4)
+
+    def peek(self, camera, frame, quality=DEFAULT_QUALITY, scale=1.0):
+        """只查缓存，不编码（不读 frame.image）；没有返回 None"""
+        key = self.key(camera, frame, quality, scale)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def get(self, camera, frame, quality=DEFAULT_QUALITY, scale=1.0):
+        """
+        取这一帧的 JPEG 编码（bytes），没有就用 frame.image 编码并缓存
+        frame.image 只在需要编码时使用，编码期间不能被修改
+        """
+        key = self.key(camera, frame, quality, scale)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            future = self._pending.get(key)
+            if future is not None:
+                self.waits += 1
+                owner = False
+            else:
+                future = self._pending[key] = Future()
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        # 由第一个请求负责编码（锁外进行，cv2.imencode 会释放 GIL）
+        try:
+            data = encode(frame.image, quality, scale)
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            self._store(key, data)
+        future.set_result(data)
+        return data
+
+    def _store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= len(old)
+            self.evictions += 1
+
+    def discard(self, camera, frame):
+        """丢掉某一帧的所有编码（例如编码期间共享内存里的帧被覆盖）"""
+        ident = (frame.seq, frame.timestamp)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == camera and k[1] == ident]:
+                self._bytes -= len(self._entries.pop(key))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "waits": self.waits,
+                    "evictions": self.evictions}
+
+
+# 进程内共享的缓存
+JPEG_CACHE = JpegCache()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MJPEG 转发服务（替代 ffmpeg/server.js）
+
+server.js 每来一个 /mjpeg 观看者就起一个 ffmpeg：N 个浏览器标签页就是 N 路
+RTSP 会话和 N 份转码，而且把 stdout 的每个数据块当成一整张 JPEG 发出去
+（数据块边界并不是帧边界，画面会撕裂、花屏）。
+
+这里每台相机只有一个上游 ffmpeg（第一个观看者来时启动，最后一个走后
+UPSTREAM_IDLE 秒停止），按 JPEG 标记（SOI … SOS 熵编码数据 … EOI）切出完整的
+帧，只保留最新一帧。每个观看者一个线程，总是发送“比上次发的新的最新帧”，
+慢的客户端自然跳帧，不会在服务端积压；相机和 CPU 负载与观看人数无关。
+
+接口（默认 0.0.0.0:8090，和 server.js 相同，camera.html/c3.html 不用改）：
+    GET /mjpeg           ?cam=hk1     multipart/x-mixed-replace 流
+    GET /snapshot.jpg    ?cam=hk1     最新一帧 JPEG
+    GET /health          各路上游状态和观看人数
+    GET /                测试页
+
+相机列表读 cameras.json（name/url），可选 "mjpeg": {"url": 子码流地址,
+"fps": 10, "height": 480, "q": 5} 覆盖转码参数；cam 省略时用 DEFAULT_CAMERA。
+
+用法: python mjpeg_relay.py [--port 8090] [--config cameras.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# ==================== 配置区 ====================
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cameras.json")
+HTTP_HOST = "0.0.0.0"
+HTTP_PORT = 8090
+DEFAULT_CAMERA = "hk1"
+FFMPEG = "ffmpeg"
+MJPEG_FPS = 10                  # 转码帧率
+MJPEG_HEIGHT = 480              # 缩放高度（0 不缩放）
+MJPEG_Q = 5                     # ffmpeg -q:v（2 最好，31 最差）
+UPSTREAM_IDLE = 10              # 没有观看者多久后停止上游（秒）
+FRAME_TIMEOUT = 10              # 上游多久没出帧算卡死，重启（秒）
+MAX_FRAME = 8 * 1024 * 1024     # 单帧上限，超过说明数据错乱，丢弃重新找 SOI
+SEND_TIMEOUT = 10               # 单次发送超时，客户端卡死就断开（秒）
+BOUNDARY = "ffserver"
+# ================================================
+
+
+class JpegSplitter:
+    """
+    从字节流中切出完整的 JPEG 帧
+    沿标记段（长度字段）走到 SOS，在熵编码数据里跳过 FF00 填充和 RSTn，
+    遇到 EOI 才算一帧结束；APP 段（如 EXIF 缩略图）里的 FFD9 不会被误判。
+    """
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self.dropped = 0            # 数据错乱丢弃的字节块数
+        self._buf = bytearray()
+        self._pos = 0               # 当前帧已解析到的位置，0 表示还没找到 SOI
+        self._in_scan = False
+
+    def feed(self, data):
+        """喂入数据，返回本次切出的完整帧列表（bytes）"""
+        self._buf.extend(data)
+        frames = []
+        while True:
+            frame = self._next()
+            if frame is None:
+                break
+            frames.append(frame)
+        if len(self._buf) > self.max_frame:
+            self._resync(len(self._buf) - 1)
+        return frames
+
+    def _resync(self, skip):
+        """丢弃前 skip 字节，重新找 SOI"""
+        del self._buf[:skip]
+        self._pos = 0
+        self._in_scan = False
+        self.dropped += 1
+
+    def _next(self):
+        buf = self._buf
+        while True:
+            if self._pos == 0:
+                start = buf.find(b"\xff\xd8")
+                if start < 0:
+                    # 保留可能是半个 SOI 的最后一个字节
+                    del buf[:max(0, len(buf) - 1)]
+                    return None
+                del buf[:start]
+                self._pos = 2
+                self._in_scan = False
+
+            pos, size = self._pos, len(buf)
+            corrupt = False
+            while True:
+                if self._in_scan:
+                    i = buf.find(b"\xff", pos)
+                    if i < 0 or i + 1 >= size:
+                        pos = size if i < 0 else i
+                        break
+                    marker = buf[i + 1]
+                    if marker == 0x00 or 0xD0 <= marker <= 0xD7:
+                        pos = i + 2         # 填充字节 / 重启标记，仍在熵编码数据里
+                    elif marker == 0xFF:
+                        pos = i + 1         # 填充的 FF
+                    else:
+                        pos = i             # 熵编码数据结束（EOI，或渐进式的下一段）
+                        self._in_scan = False
+                    continue
+                if pos + 2 > size:
+                    break
+                if buf[pos] != 0xFF:
+                    corrupt = True          # 应该是标记的位置不是 FF
+                    break
+                marker = buf[pos + 1]
+                if marker == 0xFF:
+                    pos += 1
+                    continue
+                if marker == 0xD9:
+                    end = pos + 2
+                    frame = bytes(buf[:end])
+                    del buf[:end]
+                    self._pos = 0
+                    self._in_scan = False
+                    return frame
+                if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+                    pos += 2
+                    continue
+                if pos + 4 > size:
+                    break
+                length = (buf[pos + 2] << 8) | buf[pos + 3]
+                if length < 2:
+                    corrupt = True
+                    break
+                if pos + 2 + length > size:
+                    break
+                pos += 2 + length
+                if marker == 0xDA:
+                    self._in_scan = True
+
+            if corrupt:
+                # 这一帧坏了，跳过它的 SOI 重新找
+                self._resync(2)
+                continue
+            self._pos = pos
+            return None
+
+
+class Upstream:
+    """一台相机的上游 ffmpeg（RTSP → MJPEG），有观看者时运行，最新一帧供所有观看者共享"""
+
+    def __init__(self, name, rtsp_url, fps=MJPEG_FPS, height=MJPEG_HEIGHT, q=MJPEG_Q, idle=UPSTREAM_IDLE):
+        self.name = name
+        self.rtsp_url = rtsp_url
+        self.fps = fps
+        self.height = height
+        self.q = q
+        self.idle = idle
+        self._cond = threading.Condition()
+        self._latest = None         # (jpeg 字节, 时间, 序号)
+        self._seq = 0
+        self._viewers = 0
+        self._last_viewer = time.time()
+        self._thread = None
+        self._proc = None
+        self._restarts = 0
+        self._last_error = None
+        self._splitter_dropped = 0
+
+    def command(self):
+        cmd = [FFMPEG, "-hide_banner", "-loglevel", "error",
+               "-rtsp_transport", "tcp", "-i", self.rtsp_url,
+               "-an", "-f", "mjpeg", "-q:v", str(self.q), "-r", str(self.fps)]
+        if self.height:
+            cmd += ["-vf", f"scale=-2:{self.height}"]
+        return cmd + ["-"]
+
+    # ---------- 观看者 ----------
+    def attach(self):
+        """登记一个观看者，需要时启动上游"""
+        with self._cond:
+            self._viewers += 1
+            self._last_viewer = time.time()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"mjpeg-{self.name}", daemon=True)
+                self._thread.start()
+
+    def detach(self):
+        with self._cond:
+            self._viewers -= 1
+            self._last_viewer = time.time()
+
+    def wait_frame(self, newer_than=0, timeout=FRAME_TIMEOUT):
+        """等序号大于 newer_than 的最新帧，返回 (jpeg, 时间, 序号)，超时返回 None"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                latest = self._latest
+                if latest is not None and latest[2] > newer_than:
+                    return latest
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def health(self):
+        latest = self._latest
+        return {
+            "running": self._proc is not None,
+            "viewers": self._viewers,
+            "frames": self._seq,
+            "last_frame_age_ms": round((time.time() - latest[1]) * 1000, 1) if latest else None,
+            "frame_bytes": len(latest[0]) if latest else None,
+            "restarts": self._restarts,
+            "dropped": self._splitter_dropped,
+            "last_error": self._last_error,
+        }
+
+    # ---------- 上游线程 ----------
+    def _idle(self):
+        with self._cond:
+            if self._viewers <= 0 and time.time() - self._last_viewer >= self.idle:
+                self._thread = None     # 在锁内清掉，之后来的观看者会重新启动
+                return True
+        return False
+
+    def _run(self):
+        backoff = 0.5
+        while not self._idle():
+            started = time.time()
+            self._session()
+            if self._idle():
+                break
+            if time.time() - started > 30:
+                backoff = 0.5
+            print(f"[MJPEG] {self.name} 上游中断（{self._last_error}），{backoff:.1f}s 后重启")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+            self._restarts += 1
+        print(f"[MJPEG] {self.name} 没有观看者，上游已停止")
+
+    def _session(self):
+        try:
+            proc = self._proc = subprocess.Popen(self.command(), stdin=subprocess.DEVNULL,
+                                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            self._last_error = f"启动 ffmpeg 失败: {e}"
+            self._proc = None
+            return
+        print(f"[MJPEG] {self.name} 上游已启动 {self.rtsp_url}")
+        with self._cond:
+            self._latest = None         # 上次会话留下的旧帧不再发出去
+        errors = deque(maxlen=3)    # ffmpeg 最后几行错误输出
+        threading.Thread(target=lambda: errors.extend(proc.stderr), daemon=True).start()
+        # 卡死检测：长时间不出帧或没有观看者时结束进程，读循环随之退出
+        watchdog = threading.Thread(target=self._watch, args=(proc,), daemon=True)
+        watchdog.start()
+        splitter = JpegSplitter()
+        try:
+            while True:
+                chunk = proc.stdout.read1(65536)
+                if not chunk:
+                    break
+                for frame in splitter.feed(chunk):
+                    with self._cond:
+                        self._seq += 1
+                        self._latest = (frame, time.time(), self._seq)
+                        self._cond.notify_all()
+        finally:
+            self._splitter_dropped += splitter.dropped
+            self._stop_proc(proc)
+            self._proc = None
+            code = proc.wait()
+            tail = b"".join(errors).decode("utf-8", "replace").strip()
+            self._last_error = tail or f"ffmpeg 退出码 {code}"
+
+    def _watch(self, proc):
+        last_seq, last_change = self._seq, time.time()
+        while proc.poll() is None:
+            time.sleep(1)
+            if self._seq != last_seq:
+                last_seq, last_change = self._seq, time.time()
+            with self._cond:
+                idle = self._viewers <= 0 and time.time() - self._last_viewer >= self.idle
+            if idle or time.time() - last_change > FRAME_TIMEOUT:
+                self._stop_proc(proc)
+                return
+
+    @staticmethod
+    def _stop_proc(proc):
+        if proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def load_upstreams(path=CONFIG_FILE):
+    """cameras.json → {相机名: Upstream}"""
+    with open(path, "r", encoding="utf-8") as f:
+        cameras = json.load(f)["cameras"]
+    upstreams = {}
+    for cam in cameras:
+        opts = cam.get("mjpeg", {})
+        upstreams[cam["name"]] = Upstream(cam["name"], opts.get("url", cam["url"]),
+                                          fps=opts.get("fps", MJPEG_FPS),
+                                          height=opts.get("height", MJPEG_HEIGHT),
+                                          q=opts.get("q", MJPEG_Q))
+    return upstreams
+
+
+UPSTREAMS = {}
+
+TEST_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>MJPEG Stream Test</title></head>
+<body>
+    <h1>MJPEG Stream Test</h1>
+    {images}
+</body>
+</html>
+"""
+
+
+# ---------- HTTP ----------
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_body(self, status, body, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, obj, status=200):
+        self.send_body(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        if parts.path == "/health":
+            return self.send_json({"success": True, "cameras": {name: up.health() for name, up in UPSTREAMS.items()}})
+        if parts.path == "/":
+            images = "\n    ".join(f'<h3>{name}</h3><img src="/mjpeg?cam={name}" style="max-width: 100%;" />'
+                                   for name in UPSTREAMS)
+            return self.send_body(200, TEST_PAGE.format(images=images).encode("utf-8"), "text/html; charset=utf-8")
+        if parts.path not in ("/mjpeg", "/snapshot.jpg"):
+            return self.send_json({"success": False, "error": "not_found", "message": parts.path}, 404)
+
+        name = query.get("cam", DEFAULT_CAMERA if DEFAULT_CAMERA in UPSTREAMS else next(iter(UPSTREAMS), None))
+        upstream = UPSTREAMS.get(name)
+        if upstream is None:
+            return self.send_json({"success": False, "error": "unknown_camera", "message": str(name)}, 404)
+        upstream.attach()
+        try:
+            if parts.path == "/snapshot.jpg":
+                frame = upstream.wait_frame()
+                if frame is None:
+                    return self.send_json({"success": False, "error": "timeout", "message": "上游没有出帧"}, 504)
+                return self.send_body(200, frame[0], "image/jpeg")
+            self.stream(upstream)
+        finally:
+            upstream.detach()
+
+    def stream(self, upstream):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Expires", "0")
+        self.send_header("Connection", "close")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.close_connection = True
+        self.connection.settimeout(SEND_TIMEOUT)
+        seq = 0
+        try:
+            while True:
+                # 总是取最新帧：客户端发得慢就跳过中间的帧，不在服务端排队
+                frame = upstream.wait_frame(seq)
+                if frame is None:
+                    continue        # 上游正在重启，继续等
+                jpeg, _, seq = frame
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except OSError:
+            pass                    # 客户端断开或发送超时
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MJPEG 转发服务（每台相机一个上游）")
+    parser.add_argument("--host", default=HTTP_HOST)
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    parser.add_argument("--config", default=CONFIG_FILE, help="相机列表（默认 cameras.json）")
+    args = parser.parse_args()
+
+    UPSTREAMS.update(load_upstreams(args.config))
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"[MJPEG] 监听 http://{args.host}:{args.port}/mjpeg?cam=<相机名>，相机: {', '.join(UPSTREAMS)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
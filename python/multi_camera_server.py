@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多相机圆检测服务
+
+按 cameras.json 中的相机列表，为每台相机启动一个独立的工作进程，
+在进程内完成解码和检测，相机之间不再受 GIL 和 OpenCV 线程争用影响。
+主进程只跑 TCP 服务，把 {"cmd":"detect","camera":"cam1"} 转发给对应进程。
+每台相机的解码帧写入共享内存帧环（frame_ring.py，名称按相机名），主进程
+和本机其它程序（预览、抓图脚本）都可以零拷贝读取，不用再开 RTSP。
+
+用法: python multi_camera_server.py [cameras.json]
+"""
+
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+
+from detect_tcp_server import DetectTCPServer, error_response
+from frame_ring import FrameRing
+
+# ==================== 配置区 ====================
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cameras.json")
+TCP_HOST = "0.0.0.0"
+TCP_PORT = 1991
+REQUEST_TIMEOUT = 15            # 等待工作进程响应的超时（秒）
+WORKER_THREADS = 4              # 每个工作进程同时处理的请求数（cameras.json 可用 "workers" 覆盖）
+RING_SLOTS = 4                  # 每台相机帧环的槽数
+# snapshot 命令只能写到这个目录里（cameras.json 可用 "snapshot_dir" 覆盖）；
+# path 只能是目录内的相对路径，不接受绝对路径和 ".."
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+SNAPSHOT_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+# ================================================
+
+
+# ---------- 检测配置 ----------
+def make_detector(profile, detector):
+    """
+    检测配置名 → detect(grabbed, band=None) -> 响应字典，在工作进程中调用
+    detector 是工作进程自己的 ProfileDetector（各配置的跟踪状态和按帧合并互不影响）；
+    band 为按测距估计的半径带（radius_band.RadiusBand），None 时用配置的半径范围。
+    未知配置抛 ValueError
+    """
+    if profile == "largest":
+        # detecet_cycle 的流程（高斯模糊 + 霍夫取最大圆）
+        import detecet_cycle
+        return lambda grabbed, band=None: dict(detecet_cycle.build_result(grabbed.image, band=band),
+                                               frame_seq=grabbed.seq)
+    if not detector.store.has(profile):
+        raise ValueError(f"未知检测配置: {profile}")
+    if profile == "black_edge":
+        # rtsp_unv 的流程（暗区 + 腐蚀 + 霍夫 + 黑边验证），响应格式同 rtsp_unv
+        def detect(grabbed, band=None):
+            result, shared, _ = detector.run(grabbed.seq, grabbed.image, profile, band=band)
+            return dict(result.response(), frame_seq=grabbed.seq, shared=shared)
+        return detect
+
+    # unv 和其它配置（detect_profiles.json 里自定义的 near/far 等）：unv_detect_server 的响应格式
+    def detect(grabbed, band=None):
+        result, shared, name = detector.run(grabbed.seq, grabbed.image, profile, band=band)
+        return dict(result.command_response(grabbed.seq, shared), profile=name)
+    return detect
+
+
+# ---------- 工作进程 ----------
+def camera_worker(cam, conn):
+    """
+    每台相机一个进程：抓帧 → 写帧环；按管道收到的命令做检测
+    命令在线程池里并发处理，响应按请求 id 发回；同一帧上的并发检测由
+    ProfileDetector 合并成一次计算
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from calibration import CalibrationStore
+    from detect_profiles import ProfileDetector, ProfileStore
+    from frame_check import frame_status
+    from frame_grabber import FrameGrabber
+    from radius_band import (RADIUS_CALIBRATION_FILE, CalibrationError, RadiusCalibration,
+                             band_from_request, band_info)
+
+    name = cam["name"]
+    default_profile = cam.get("profile", "unv")
+    detector = ProfileDetector(ProfileStore(), default_profile)
+    detectors = {default_profile: make_detector(default_profile, detector)}
+    detectors_lock = threading.Lock()
+    # 每台相机各自的距离/变焦标定（镜头不同），默认 radius_calibration.json；
+    # 没给变焦的请求按镜头标定取变焦，同单相机服务
+    calibration = RadiusCalibration(cam.get("calibration", RADIUS_CALIBRATION_FILE),
+                                     lenses=CalibrationStore())
+    state = {"ring": None}
+    send_lock = threading.Lock()
+
+    def on_frame(frame):
+        # 收到第一帧后才知道分辨率，此时创建帧环
+        ring = state["ring"]
+        if ring is None:
+            ring = state["ring"] = FrameRing.create(name, frame.image.shape, cam.get("ring_slots", RING_SLOTS))
+        try:
+            ring.write(frame.image, frame.timestamp)
+        except ValueError as e:
+            print(f"[{name}] {e}")
+
+    grabber = FrameGrabber(cam["url"], name=name, on_frame=on_frame).start()
+    timeout = cam.get("timeout", 10)
+
+    def get_detector(profile):
+        with detectors_lock:
+            detect = detectors.get(profile)
+            if detect is None:
+                detect = detectors[profile] = make_detector(profile, detector)
+            return detect
+
+    def handle_detect(cmd):
+        # 请求可以用 "profile" 临时换一套检测配置
+        try:
+            detect = get_detector(cmd.get("profile") or default_profile)
+        except ValueError as e:
+            return error_response("unknown_profile", str(e), "detect")
+        try:
+            band = band_from_request(cmd, calibration)
+        except CalibrationError as e:
+            return error_response("bad_calibration", str(e), "detect")
+        except ValueError as e:
+            return error_response("invalid_param", str(e), "detect")
+        grabbed = grabber.latest()
+        if grabbed is None or not grabber.health()["connected"]:
+            grabbed = grabber.wait_frame(timeout, newer_than=grabbed.seq if grabbed else 0)
+        if grabbed is None:
+            return error_response("timeout", "无法从 RTSP 流获取图像", "detect")
+        response = detect(grabbed, band)
+        # 连着流时直接用 latest()，帧可能已经旧了（流卡住还没判断线），带上帧龄
+        response.update(frame_status(grabbed))
+        info = band_info(band, cmd)     # 没有标定点时为 {"status": "uncalibrated"}
+        if info is not None:
+            response.setdefault("band", info)
+        return response
+
+    def handle(req_id, cmd):
+        cmd_name = cmd.get("cmd")
+        try:
+            if cmd_name == "detect":
+                response = handle_detect(cmd)
+            elif cmd_name == "health":
+                response = grabber.health()
+            else:
+                response = error_response("unknown_command", f"未知命令: {cmd_name}", cmd_name)
+        except Exception as e:
+            response = error_response("internal_error", str(e), cmd_name)
+        try:
+            with send_lock:
+                conn.send((req_id, response))
+        except OSError:
+            pass    # 主进程已经关闭管道
+
+    pool = ThreadPoolExecutor(max_workers=cam.get("workers", WORKER_THREADS),
+                              thread_name_prefix=f"{name}-request")
+    try:
+        while True:
+            try:
+                req_id, cmd = conn.recv()
+            except (EOFError, OSError):
+                break
+            pool.submit(handle, req_id, cmd)
+    finally:
+        pool.shutdown(wait=False)
+        grabber.stop()
+        if state["ring"] is not None:
+            state["ring"].close()
+
+
+# ---------- 主进程 ----------
+class CameraProcess:
+    """主进程里对一个工作进程的代理"""
+
+    def __init__(self, cam, ctx):
+        self.cam = cam
+        self.name = cam["name"]
+        self._ring = None
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=camera_worker, args=(cam, child),
+                                   name=f"camera-{self.name}", daemon=True)
+        self._lock = threading.Lock()
+        self._req_id = 0
+        self._pending = {}      # 请求 id → Future，等工作进程的响应
+
+    def start(self):
+        self.process.start()
+        threading.Thread(target=self._read_responses, name=f"camera-{self.name}-responses",
+                         daemon=True).start()
+        print(f"[相机] {self.name} 工作进程 pid={self.process.pid} -> {self.cam['url']}")
+
+    def _read_responses(self):
+        """按请求 id 把工作进程的响应交给等待的请求；超时请求迟到的响应直接丢弃"""
+        while True:
+            try:
+                req_id, response = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(req_id, None)
+            if future is not None:
+                future.set_result(response)
+        # 工作进程退出：还在等的请求都结束掉
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_result(None)
+
+    def request(self, cmd, timeout=REQUEST_TIMEOUT):
+        """
+        发送命令并等待响应；同一相机可以同时有多个请求在工作进程里处理，
+        同一帧上的并发检测在工作进程内合并
+        """
+        future = Future()
+        with self._lock:
+            if not self.process.is_alive():
+                return error_response("worker_dead", f"相机 {self.name} 工作进程已退出", cmd.get("cmd"))
+            self._req_id += 1
+            req_id = self._req_id
+            self._pending[req_id] = future
+            try:
+                self.conn.send((req_id, cmd))
+            except OSError:
+                self._pending.pop(req_id, None)
+                return error_response("worker_dead", f"相机 {self.name} 工作进程已退出", cmd.get("cmd"))
+        try:
+            response = future.result(timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._pending.pop(req_id, None)
+            return error_response("timeout", f"相机 {self.name} 响应超时", cmd.get("cmd"))
+        if response is None:
+            return error_response("worker_dead", f"相机 {self.name} 工作进程已退出", cmd.get("cmd"))
+        return response
+
+    def ring(self):
+        """连接该相机的帧环（工作进程收到第一帧后才存在），失败返回 None"""
+        if self._ring is None:
+            try:
+                self._ring = FrameRing.attach(self.name)
+            except (FileNotFoundError, ValueError):
+                return None
+        return self._ring
+
+    def status(self):
+        """从帧环头部读帧状态，不打扰工作进程"""
+        ring = self.ring()
+        info = ring.info() if ring is not None else None
+        return {
+            "alive": self.process.is_alive(),
+            "frames": info.seq if info else 0,
+            "last_frame_age_ms": round((time.time() - info.timestamp) * 1000, 1) if info and info.seq else None,
+        }
+
+    def stop(self):
+        self.conn.close()
+        self.process.join(2)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self._ring is not None:
+            self._ring.close()
+
+
+def snapshot_path(directory, path):
+    """客户端给的文件名 → 快照目录内的绝对路径，越界或扩展名不支持时抛 ValueError"""
+    if not path or os.path.isabs(path) or os.path.splitdrive(path)[0]:
+        raise ValueError("path 必须是快照目录内的相对路径")
+    parts = path.replace("\\", "/").split("/")
+    if ".." in parts:
+        raise ValueError("path 不能包含 ..")
+    if os.path.splitext(path)[1].lower() not in SNAPSHOT_EXTS:
+        raise ValueError(f"只支持 {', '.join(SNAPSHOT_EXTS)}")
+    root = os.path.realpath(directory)
+    full = os.path.realpath(os.path.join(root, path))
+    # 符号链接也不能指到目录外
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError("path 超出快照目录")
+    return full
+
+
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    cameras = config.get("cameras", [])
+    if not cameras:
+        raise ValueError(f"{path} 中没有配置相机")
+    names = [cam["name"] for cam in cameras]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path} 中相机名称重复")
+    return config
+
+
+def start_server(config_path=CONFIG_FILE):
+    config = load_config(config_path)
+    ctx = mp.get_context("spawn")
+    cameras = {}
+    for cam in config["cameras"]:
+        cameras[cam["name"]] = CameraProcess(cam, ctx)
+    default_camera = config["cameras"][0]["name"]
+    snapshot_dir = config.get("snapshot_dir", SNAPSHOT_DIR)
+    for proc in cameras.values():
+        proc.start()
+
+    def pick(cmd):
+        name = cmd.get("camera", default_camera)
+        return cameras.get(name), name
+
+    def handle_detect(cmd):
+        proc, name = pick(cmd)
+        if proc is None:
+            return error_response("unknown_camera", f"未知相机: {name}", "detect")
+        # 激光测距/变焦原样转给工作进程，按该相机的标定收窄半径范围
+        request = {"cmd": "detect", "profile": cmd.get("profile")}
+        request.update({k: cmd[k] for k in ("distance", "zoom", "tolerance") if k in cmd})
+        response = proc.request(request)
+        response["camera"] = name
+        return response
+
+    def handle_snapshot(cmd):
+        """从帧环取该相机最新帧保存到快照目录（不经过工作进程）"""
+        import cv2
+        from jpeg_cache import JPEG_CACHE
+        proc, name = pick(cmd)
+        if proc is None:
+            return error_response("unknown_camera", f"未知相机: {name}", "snapshot")
+        try:
+            path = snapshot_path(snapshot_dir, cmd.get("path") or f"snapshot_{name}.jpg")
+        except ValueError as e:
+            return error_response("invalid_path", str(e), "snapshot")
+        ring = proc.ring()
+        frame = ring.latest() if ring is not None else None
+        if frame is None:
+            return error_response("no_frame", f"相机 {name} 还没有图像", "snapshot")
+        # 缓存键（序号 + 采集时间）在 latest() 时已经拷出；先确认槽还没被覆盖再查缓存，
+        # 命中就不碰共享内存。没命中时拷出完整的一帧再编码，缓存里不会有撕裂的数据
+        seq, shape = frame.seq, frame.image.shape
+        ext = os.path.splitext(path)[1].lower()
+        jpeg = ext in (".jpg", ".jpeg")
+        if not frame.valid():
+            return error_response("frame_overwritten", "读取期间帧被覆盖，请重试", "snapshot")
+        data = JPEG_CACHE.peek(name, frame) if jpeg else None
+        if data is None:
+            detached = frame.detach()
+            if detached is None:
+                return error_response("frame_overwritten", "读取期间帧被覆盖，请重试", "snapshot")
+            try:
+                if jpeg:
+                    data = JPEG_CACHE.get(name, detached)
+                else:
+                    ok, buf = cv2.imencode(ext, detached.image)
+                    data = buf.tobytes() if ok else None
+            except ValueError:
+                data = None
+        if data is None:
+            return error_response("write_failed", f"保存失败: {path}", "snapshot")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            return error_response("write_failed", f"保存失败: {e}", "snapshot")
+        return {
+            "success": True,
+            "cmd": "snapshot",
+            "camera": name,
+            "path": path,
+            "frame_seq": seq,
+            "frame_age_ms": round((time.time() - frame.timestamp) * 1000, 1),
+            "image": {"width": int(shape[1]), "height": int(shape[0])},
+            "timestamp": datetime.now().isoformat()
+        }
+
+    # 距离 → 变焦/对焦设定值直接在主进程查表（每台相机按配置里的 "lens"）
+    from calibration import DEFAULT_LENS, CalibrationStore, setpoint_command
+    lenses = CalibrationStore()
+
+    def handle_setpoint(cmd):
+        proc, name = pick(cmd)
+        if proc is None:
+            return error_response("unknown_camera", f"未知相机: {name}", "setpoint")
+        response = setpoint_command(lenses, cmd, proc.cam.get("lens", DEFAULT_LENS))
+        response["camera"] = name
+        return response
+
+    # 真正的计算在各自进程里，这里的线程只是等响应；线程数够每台相机的并发请求数即可
+    server = DetectTCPServer(config.get("host", TCP_HOST), config.get("port", TCP_PORT),
+                             workers=sum(cam.get("workers", WORKER_THREADS) for cam in config["cameras"]) + 1)
+    server.register("detect", handle_detect, aliases=["detecet"])
+    server.register("snapshot", handle_snapshot)
+    server.register("setpoint", handle_setpoint, blocking=False)
+    server.ping_info = lambda: {"cameras": {name: proc.status() for name, proc in cameras.items()}}
+    print(f"   相机: {', '.join(cameras)}（默认 {default_camera}）")
+    print(f"   发送: {{\"cmd\": \"detect\", \"camera\": \"{default_camera}\"}} → 执行检测")
+    try:
+        server.serve_forever()
+    finally:
+        for proc in cameras.values():
+            proc.stop()
+
+
+if __name__ == "__main__":
+    start_server(sys.argv[1] if len(sys.argv) > 1 else CONFIG_FILE)
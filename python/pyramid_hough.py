@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金字塔粗到精霍夫圆检测
+
+先在降采样的金字塔层上找候选圆（参数按层自动缩放），再回到全分辨率
+图像、只在每个候选周围的小窗口内用窄半径带重新做霍夫确认并精修圆心
+和半径。输出为全分辨率坐标的浮点 (x, y, r)，保留亚像素精度。
+"""
+
+import cv2
+import numpy as np
+
+MIN_COARSE_RADIUS = 8   # 粗层上允许的最小半径（像素），再小霍夫就不可靠了
+MIN_COARSE_SIDE = 160   # 粗层图像短边下限（像素）
+MIN_PARAM2 = 10         # 粗层累加器阈值下限
+REFINE_BAND = 0.08      # 精修半径带（相对半径 ±），覆盖粗黑环内外两条边的差异
+
+
+def auto_levels(shape, min_radius, max_levels=3):
+    """按最小半径和图像尺寸选择金字塔层数"""
+    short_side = min(shape[:2])
+    levels = 0
+    while levels < max_levels:
+        s = 2 ** (levels + 1)
+        if min_radius / s < MIN_COARSE_RADIUS or short_side / s < MIN_COARSE_SIDE:
+            break
+        levels += 1
+    return levels
+
+
+def scale_params(scale, dp, min_dist, param1, param2, min_radius, max_radius):
+    """
+    全分辨率霍夫参数 → 缩小 scale 倍后的参数
+    距离和半径按比例缩小；累加器票数约与周长成正比，param2 同样缩小；
+    Canny 阈值 param1 与尺度无关
+    """
+    return {
+        "dp": dp,
+        "minDist": max(1.0, min_dist / scale),
+        "param1": param1,
+        "param2": max(MIN_PARAM2, param2 / scale),
+        "minRadius": max(1, int(np.floor(min_radius / scale))),
+        "maxRadius": max(2, int(np.ceil(max_radius / scale))),
+    }
+
+
+def refine_circle(img, x, y, r, scale, dp, param1, param2, min_radius, max_radius):
+    """
+    在全分辨率图像上、候选 (x, y, r) 周围的窗口内重新检测
+    半径带为 r ± max(2*scale+2, r*REFINE_BAND)，找不到返回 None
+    """
+    h, w = img.shape[:2]
+    band = max(2 * scale + 2, r * REFINE_BAND)
+    lo = max(min_radius, int(np.floor(r - band)))
+    hi = min(max_radius, int(np.ceil(r + band)))
+    if lo > hi:
+        return None
+
+    reach = hi + band
+    x0, y0 = max(0, int(x - reach)), max(0, int(y - reach))
+    x1, y1 = min(w, int(x + reach) + 1), min(h, int(y + reach) + 1)
+    window = img[y0:y1, x0:x1]
+    if window.size == 0:
+        return None
+
+    found = cv2.HoughCircles(
+        window, cv2.HOUGH_GRADIENT, dp=dp, minDist=max(window.shape),
+        param1=param1, param2=param2, minRadius=lo, maxRadius=hi)
+    if found is None:
+        return None
+
+    # 窗口里可能不止一个圆，取离候选圆心最近的
+    found = found[0]
+    fx, fy = found[:, 0] + x0, found[:, 1] + y0
+    best = int(np.argmin((fx - x) ** 2 + (fy - y) ** 2))
+    return float(fx[best]), float(fy[best]), float(found[best, 2])
+
+
+def hough_pyramid(img, dp, min_dist, param1, param2, min_radius, max_radius,
+                  levels="auto", max_levels=3):
+    """
+    粗到精霍夫检测，参数含义同 cv2.HoughCircles（全分辨率下的值）
+    返回 (N, 3) float32 数组（全分辨率坐标）或 None
+    levels: 金字塔层数，"auto" 按最小半径自动选择，0 表示直接全分辨率检测；
+            给定层数时也不超过半径带能分辨的层数（粗层半径不小于 MIN_COARSE_RADIUS）
+    """
+    if levels == "auto":
+        levels = auto_levels(img.shape, min_radius, max_levels)
+    elif levels > 0:
+        levels = min(levels, auto_levels(img.shape, min_radius, levels))
+
+    if levels <= 0:
+        circles = cv2.HoughCircles(
+            img, cv2.HOUGH_GRADIENT, dp=dp, minDist=min_dist,
+            param1=param1, param2=param2, minRadius=min_radius, maxRadius=max_radius)
+        return None if circles is None else circles[0].astype(np.float32)
+
+    coarse = img
+    for _ in range(levels):
+        coarse = cv2.pyrDown(coarse)
+    scale = 2 ** levels
+
+    params = scale_params(scale, dp, min_dist, param1, param2, min_radius, max_radius)
+    candidates = cv2.HoughCircles(coarse, cv2.HOUGH_GRADIENT, **params)
+    if candidates is None:
+        return None
+
+    refined = []
+    for cx, cy, cr in candidates[0]:
+        # 金字塔每层像素中心偏移 0.5，映射回全分辨率时补偿
+        x = (cx + 0.5) * scale - 0.5
+        y = (cy + 0.5) * scale - 0.5
+        circle = refine_circle(img, x, y, cr * scale, scale, dp,
+                               param1, param2, min_radius, max_radius)
+        if circle is None:
+            continue
+        # 去掉精修后落到同一个圆上的重复候选
+        if any((circle[0] - px) ** 2 + (circle[1] - py) ** 2 < min_dist ** 2 for px, py, _ in refined):
+            continue
+        refined.append(circle)
+
+    if not refined:
+        return None
+    return np.array(refined, dtype=np.float32)
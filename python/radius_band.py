@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按激光测距和变焦估计目标圆的像素半径，收窄霍夫的半径搜索范围
+
+激光测距（node-red/flows/laser.json）写入全局 laser（米），camera_unv.json 的
+"do auto" 再按距离插值设置变焦。目标圆实际尺寸不变，成像半径 ∝ 焦距 / 距离：
+每个标定点 (距离, 变焦, 半径像素) 算出 k = 半径 × 距离，k 只和变焦有关，
+按变焦分段线性插值。检测请求带上距离（和当前变焦）时：
+
+    预计半径 r = k(zoom) / distance
+    minRadius / maxRadius = r × (1 ∓ tolerance)
+    minDist = r（画面里只有一个目标圆，圆心距小于半径的都是重复检测）
+
+没给变焦时按镜头标定（calibration.py，和 "do auto" 同一组数据）取该距离的变焦。
+霍夫的耗时随半径范围增长，半径带收窄后检测更快，误检也更少。
+
+标定文件 radius_calibration.json 修改后自动重新加载；没有标定点时不收窄，
+按检测配置的半径范围搜索，带了 distance 的请求响应里 band 为
+{"status": "uncalibrated"}，调用方能看出半径带没有生效。添加标定点：
+
+    python radius_band.py add --distance 10.035 --radius 312
+    python radius_band.py show 12.5
+"""
+
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from calibration import DEFAULT_LENS, CalibrationStore
+from hot_reload import HotReloadFile
+
+RADIUS_CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       "radius_calibration.json")
+
+DEFAULT_TOLERANCE = 0.2     # 半径带相对预计半径 ±
+MIN_HALF_WIDTH = 8          # 半径带最少 ± 多少像素（预计半径很小时）
+
+BAND_OK = "ok"
+BAND_UNCALIBRATED = "uncalibrated"     # 请求带了 distance，但没有标定点，没收窄
+
+# 收窄后的搜索参数；expected/distance/zoom 只用于响应里回显
+RadiusBand = namedtuple("RadiusBand", ["min_radius", "max_radius", "min_dist",
+                                       "expected", "distance", "zoom"])
+
+
+class CalibrationError(Exception):
+    """标定数据用不了（例如引用的镜头标定不存在），检测响应 bad_calibration"""
+
+
+class RadiusCalibration(HotReloadFile):
+    label = "标定"
+    errors = (OSError, ValueError, TypeError, KeyError)
+
+    def __init__(self, path=RADIUS_CALIBRATION_FILE, check_interval=1.0, lenses=None):
+        self.lenses = lenses or CalibrationStore()   # 距离 → 变焦（没给 zoom 时用）
+        super().__init__(path, check_interval)
+
+    # ---------- 加载 ----------
+    def load(self, mtime):
+        return build_model(self.read(self.path) if mtime is not None else {}, self.lenses)
+
+    def fallback(self):
+        return build_model({}, self.lenses)
+
+    @staticmethod
+    def read(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # ---------- 计算 ----------
+    def zoom_for(self, distance):
+        """按镜头标定取该距离的变焦（超出范围取端点，同 Node-RED）；镜头标定没了抛 CalibrationError"""
+        self.maybe_reload()
+        lens = self.value["lens"]
+        if not self.lenses.has(lens):
+            # 加载时校验过，但 calibration.json 之后可能改掉了这个镜头
+            raise CalibrationError(f"半径标定引用的镜头标定不存在: {lens}")
+        return float(self.lenses.get(lens).evaluate(distance)["zoom"])
+
+    def expected_radius(self, distance, zoom=None):
+        """预计像素半径；没有标定点时返回 None"""
+        self.maybe_reload()
+        model = self.value
+        if model["k"] is None:
+            return None
+        if zoom is None:
+            zoom = self.zoom_for(distance)
+        k_zooms, k_values = model["k"]
+        return float(np.interp(zoom, k_zooms, k_values)) / distance
+
+    def band(self, distance, zoom=None, tolerance=None):
+        """距离/变焦 → RadiusBand；没有标定点时返回 None"""
+        if distance is None or distance <= 0:
+            return None
+        self.maybe_reload()
+        if self.value["k"] is None:
+            return None
+        if zoom is None:
+            zoom = self.zoom_for(distance)
+        r = self.expected_radius(distance, zoom)
+        if r is None:
+            return None
+        if tolerance is None:
+            tolerance = self.value["tolerance"]
+        half = max(r * tolerance, MIN_HALF_WIDTH)
+        lo = max(1, int(r - half))
+        hi = int(np.ceil(r + half))
+        return RadiusBand(lo, hi, max(1, int(r)), round(r, 1), distance, zoom)
+
+
+def build_model(data, lenses):
+    """标定文件内容 → 插值用的数组；"lens" 指定距离→变焦用哪个镜头标定"""
+    lens = data.get("lens", DEFAULT_LENS)
+
+    points = data.get("points") or []
+    if points and not lenses.has(lens):
+        # 没给变焦的请求要按这个镜头取变焦，镜头不存在就不能用这份标定
+        raise ValueError(f"未知镜头标定: {lens}")
+    by_zoom = {}
+    for p in points:
+        distance, radius = float(p["distance"]), float(p["radius"])
+        if distance <= 0 or radius <= 0:
+            raise ValueError(f"标定点无效: {p}")
+        zoom = p.get("zoom")
+        if zoom is None:
+            zoom = lenses.get(lens).evaluate(distance)["zoom"]
+        zoom = float(zoom)
+        # 同一变焦的多个点取平均
+        by_zoom.setdefault(zoom, []).append(radius * distance)
+    k = None
+    if by_zoom:
+        zooms = sorted(by_zoom)
+        k = (np.array(zooms), np.array([np.mean(by_zoom[z]) for z in zooms]))
+    return {
+        "lens": lens,
+        "k": k,
+        "tolerance": float(data.get("tolerance", DEFAULT_TOLERANCE)),
+    }
+
+
+def band_from_request(cmd, calibration):
+    """
+    从检测请求取 distance / zoom / tolerance 算半径带
+    没带 distance 或没有标定时返回 None（按检测配置的半径范围搜索）；
+    参数类型不对抛 ValueError，标定不可用抛 CalibrationError
+    """
+    distance = cmd.get("distance")
+    if distance is None or calibration is None:
+        return None
+    zoom = cmd.get("zoom")
+    tolerance = cmd.get("tolerance")
+    try:
+        distance = float(distance)
+        zoom = None if zoom is None else float(zoom)
+        tolerance = None if tolerance is None else float(tolerance)
+    except (TypeError, ValueError):
+        raise ValueError("distance / zoom / tolerance 必须是数字")
+    if not np.isfinite(distance) or distance <= 0:
+        raise ValueError("distance 必须是正数")
+    return calibration.band(distance, zoom, tolerance)
+
+
+def band_info(band, cmd=None):
+    """
+    响应里回显的半径带（status 为 "ok"）；没有半径带但请求带了 distance 时
+    返回 {"status": "uncalibrated"}，请求没带 distance 时返回 None
+    """
+    if band is None:
+        if cmd and cmd.get("distance") is not None:
+            return {"status": BAND_UNCALIBRATED}
+        return None
+    return dict(band._asdict(), status=BAND_OK)
+
+
+def add_point(path, distance, radius, zoom=None):
+    """追加一个标定点（检测到的半径 + 当时的距离/变焦）"""
+    data = RadiusCalibration.read(path) if os.path.exists(path) else {}
+    point = {"distance": distance, "radius": radius}
+    if zoom is not None:
+        point["zoom"] = zoom
+    data.setdefault("points", []).append(point)
+    build_model(data, CalibrationStore())   # 先校验再写
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    return point
+
+
+def main():
+    parser = argparse.ArgumentParser(description="距离/变焦 → 目标圆半径带的标定")
+    parser.add_argument("--file", default=RADIUS_CALIBRATION_FILE, help="标定文件")
+    sub = parser.add_subparsers(dest="action", required=True)
+    add = sub.add_parser("add", help="添加标定点")
+    add.add_argument("--distance", type=float, required=True, help="激光测距（米）")
+    add.add_argument("--radius", type=float, required=True, help="检测到的半径（像素）")
+    add.add_argument("--zoom", type=float, default=None, help="变焦位置（默认按镜头标定）")
+    show = sub.add_parser("show", help="显示某个距离的半径带")
+    show.add_argument("distance", type=float)
+    show.add_argument("--zoom", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.action == "add":
+        print(json.dumps(add_point(args.file, args.distance, args.radius, args.zoom), ensure_ascii=False))
+    else:
+        band = RadiusCalibration(args.file).band(args.distance, args.zoom)
+        print(json.dumps(band_info(band, {"distance": args.distance}), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
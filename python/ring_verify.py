@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量验证霍夫候选圆是否为“连续的黑色圆环”
+
+替代原来每个候选都要建整幅掩码、全图 np.where、minEnclosingCircle
+的做法：按半径缓存圆环采样偏移，一次花式索引取出所有候选的圆环像素，
+用 bincount 按候选聚合，输出每个候选的
+    mean        圆环平均灰度
+    dark_ratio  黑像素数 / 理论圆环面积（原“圆形度”）
+    coverage    有黑像素覆盖的角度扇区比例
+    continuity  最长连续覆盖扇区 / 总扇区数
+    fit_error   黑像素最小二乘拟合圆与候选圆的偏差（相对半径）
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+ANGLE_BINS = 64
+
+
+@lru_cache(maxsize=512)
+def ring_offsets(radius, thickness):
+    """
+    半径 radius、宽度 thickness 的圆环相对圆心的像素偏移 (dy, dx, 角度扇区)
+    按 (radius, thickness) 缓存，同一半径只计算一次
+    """
+    half = thickness / 2.0
+    inner2 = max(radius - half, 0) ** 2
+    outer2 = (radius + half) ** 2
+    reach = int(np.floor(radius + half))
+
+    # 逐行求圆环在该行的 |dx| 区间 [lo, hi]，不必生成整块网格
+    rows = np.arange(-reach, reach + 1)
+    rem_out = outer2 - rows * rows
+    hi = np.floor(np.sqrt(np.maximum(rem_out, 0))).astype(np.int64)
+    rem_in = inner2 - rows * rows
+    lo = np.where(rem_in > 0, np.ceil(np.sqrt(np.maximum(rem_in, 0))), 0).astype(np.int64)
+    valid = (rem_out >= 0) & (hi >= lo)
+    rows, lo, hi = rows[valid], lo[valid], hi[valid]
+
+    # 右半边 dx ∈ [lo, hi]
+    lengths = hi - lo + 1
+    dy_r = np.repeat(rows, lengths)
+    starts = np.repeat(lo - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    dx_r = np.arange(lengths.sum()) + starts
+    # 左半边镜像（dx=0 不重复）
+    mirror = dx_r > 0
+    dy = np.concatenate([dy_r, dy_r[mirror]]).astype(np.int32)
+    dx = np.concatenate([dx_r, -dx_r[mirror]]).astype(np.int32)
+    angle = np.arctan2(dy, dx)
+    bins = ((angle + np.pi) / (2 * np.pi) * ANGLE_BINS).astype(np.int32) % ANGLE_BINS
+    for arr in (dy, dx, bins):
+        arr.setflags(write=False)
+    return dy, dx, bins
+
+
+def _longest_circular_run(covered):
+    """covered: (N, B) 布尔数组，返回每行最长的首尾相接 True 段长度"""
+    n, b = covered.shape
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    doubled = np.concatenate([covered, covered], axis=1)
+    idx = np.arange(2 * b)
+    last_false = np.maximum.accumulate(np.where(doubled, -1, idx), axis=1)
+    runs = (idx - last_false).max(axis=1)
+    return np.minimum(runs, b)
+
+
+def _fit_circles(cand, u, v, weights, n):
+    """
+    按候选分组做 Kasa 最小二乘拟合圆（坐标相对候选圆心）
+    返回每个候选的 (cx, cy, r)，点数不足时为 nan
+    """
+    z = u * u + v * v
+
+    def s(values):
+        return np.bincount(cand, weights=values * weights, minlength=n)
+
+    cnt = s(np.ones_like(u))
+    su, sv = s(u), s(v)
+    suu, svv, suv = s(u * u), s(v * v), s(u * v)
+    suz, svz, sz = s(u * z), s(v * z), s(z)
+
+    a = np.empty((n, 3, 3))
+    a[:, 0] = np.stack([suu, suv, su], axis=1)
+    a[:, 1] = np.stack([suv, svv, sv], axis=1)
+    a[:, 2] = np.stack([su, sv, cnt], axis=1)
+    rhs = -np.stack([suz, svz, sz], axis=1)
+
+    out = np.full((n, 3), np.nan)
+    ok = cnt >= 3
+    ok[ok] = np.abs(np.linalg.det(a[ok])) > 1e-9
+    if ok.any():
+        sol = np.linalg.solve(a[ok], rhs[ok][..., None])[..., 0]
+        d, e, f = sol[:, 0], sol[:, 1], sol[:, 2]
+        cx, cy = -d / 2, -e / 2
+        r2 = cx * cx + cy * cy - f
+        out[ok] = np.stack([cx, cy, np.sqrt(np.maximum(r2, 0))], axis=1)
+    return out
+
+
+def verify_circles(gray, circles, thickness=15, dark_thresh=80, fit=True):
+    """
+    批量计算候选圆的圆环指标
+    gray:    单通道灰度图
+    circles: 可迭代的 (x, y, r)
+    返回字典，每个值都是长度为 N 的数组
+    """
+    circles = np.asarray(circles, dtype=np.int64).reshape(-1, 3)
+    n = len(circles)
+    h, w = gray.shape[:2]
+
+    cand_parts, y_parts, x_parts, bin_parts = [], [], [], []
+    expected = np.zeros(n)
+    for i, (x, y, r) in enumerate(circles):
+        dy, dx, bins = ring_offsets(int(r), int(thickness))
+        expected[i] = len(dy)
+        cand_parts.append(np.full(len(dy), i, dtype=np.int32))
+        y_parts.append(dy + y)
+        x_parts.append(dx + x)
+        bin_parts.append(bins)
+
+    if n == 0:
+        empty = np.zeros(0)
+        return {"mean": empty, "dark_ratio": empty, "coverage": empty,
+                "continuity": empty, "fit_error": empty, "in_frame": empty}
+
+    cand = np.concatenate(cand_parts)
+    ys = np.concatenate(y_parts)
+    xs = np.concatenate(x_parts)
+    bins = np.concatenate(bin_parts)
+
+    # 只保留落在图像内的像素（即各候选包围盒与图像的交集）
+    inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+    cand, ys, xs, bins = cand[inside], ys[inside], xs[inside], bins[inside]
+
+    values = gray[ys, xs].astype(np.float64)
+    dark = values <= dark_thresh
+
+    count = np.bincount(cand, minlength=n).astype(np.float64)
+    total = np.bincount(cand, weights=values, minlength=n)
+    dark_count = np.bincount(cand, weights=dark, minlength=n)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total / count, 255.0)
+        dark_ratio = dark_count / np.maximum(expected, 1)
+
+        # 角度扇区覆盖：扇区内过半像素为黑视为覆盖
+        key = cand * ANGLE_BINS + bins
+        bin_total = np.bincount(key, minlength=n * ANGLE_BINS).reshape(n, ANGLE_BINS)
+        bin_dark = np.bincount(key, weights=dark, minlength=n * ANGLE_BINS).reshape(n, ANGLE_BINS)
+        covered = (bin_total > 0) & (bin_dark * 2 >= bin_total)
+    coverage = covered.mean(axis=1)
+    continuity = _longest_circular_run(covered) / ANGLE_BINS
+
+    fit_error = np.full(n, np.inf)
+    if fit:
+        u = (xs - circles[cand, 0]).astype(np.float64)
+        v = (ys - circles[cand, 1]).astype(np.float64)
+        fitted = _fit_circles(cand, u, v, dark.astype(np.float64), n)
+        r = np.maximum(circles[:, 2].astype(np.float64), 1)
+        err = (np.abs(fitted[:, 2] - r) + np.abs(fitted[:, 0]) + np.abs(fitted[:, 1])) / r
+        fit_error = np.where(np.isnan(err), np.inf, err)
+
+    return {
+        "mean": mean,
+        "dark_ratio": dark_ratio,
+        "coverage": coverage,
+        "continuity": continuity,
+        "fit_error": fit_error,
+        "in_frame": count / np.maximum(expected, 1),
+    }
+
+
+def good_circle_mask(scores, max_mean=80, min_dark_ratio=0.4, max_fit_error=0.15):
+    """按原 is_good_circle 的阈值筛选：够黑、够完整、拟合误差小"""
+    return ((scores["mean"] <= max_mean)
+            & (scores["dark_ratio"] >= min_dark_ratio)
+            & (scores["fit_error"] <= max_fit_error))
@@ -3,7 +3,7 @@ import json
 
 client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 client.connect(("127.0.0.1", 1991))
-client.send(json.dumps({"command": "detect"}).encode('utf-8'))
-response = client.recv(4096).decode('utf-8')
+client.send((json.dumps({"cmd": "detect"}) + "\n").encode('utf-8'))
+response = client.makefile('r', encoding='utf-8').readline()
 print(response)
-client.close()
\ No newline at end of file
+client.close()
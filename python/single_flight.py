@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按帧序号合并并发检测请求（single-flight）
+
+同一帧上并发的多个 detect 只真正计算一次，所有请求拿到同一份结果；
+结果一直缓存到更新的帧到来为止。突发轮询时 CPU 开销只随帧数增长，
+不随请求数增长。
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class FrameSingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = None
+        self._future = None
+        self.computed = 0   # 实际计算次数
+        self.shared = 0     # 直接复用结果的次数
+
+    def run(self, seq, func):
+        """
+        对帧 seq 执行 func()，返回 (结果, 是否复用)
+        同一 seq 正在计算时等待它完成；已算完则直接返回缓存结果
+        """
+        with self._lock:
+            if self._future is not None and self._seq == seq:
+                future = self._future
+                self.shared += 1
+                waiter = True
+            else:
+                future = Future()
+                waiter = False
+                self.computed += 1
+                if self._seq is None or seq > self._seq:
+                    # 更新的帧：替换缓存
+                    self._seq = seq
+                    self._future = future
+
+        if waiter:
+            return future.result(), True
+
+        # 由创建 future 的请求负责计算；更旧的帧单独算且不进缓存
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            with self._lock:
+                # 出错不缓存，下一个请求重新计算
+                if self._future is future:
+                    self._future = None
+                    self._seq = None
+            raise
+        future.set_result(result)
+        return result, False
+
+    def invalidate(self):
+        with self._lock:
+            self._future = None
+            self._seq = None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+常驻快照服务（snapshot_daemon.py）的瘦客户端
+
+只用标准库，不导入 cv2/NumPy：unv_save.py、detecet_cycle.py 启动时先调用
+forward_cli()，服务在跑就把命令行参数原样转过去，打印服务的输出并按它的
+返回码退出；服务没在跑（连接被拒/超时）返回 None，脚本继续走原来直接连
+RTSP 的流程。命令行加 --direct 或设置 SNAPSHOT_DAEMON=off 不转发。
+"""
+
+import http.client
+import json
+import os
+import sys
+from urllib.parse import urlsplit
+
+DAEMON_URL = os.environ.get("SNAPSHOT_DAEMON", "http://127.0.0.1:1992")
+CONNECT_TIMEOUT = 0.3   # 连不上就当服务没在跑（秒）
+
+
+def connect(url=DAEMON_URL):
+    """连接服务，连不上抛 OSError（ConnectionRefusedError / socket.timeout 等）"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=CONNECT_TIMEOUT)
+    conn.connect()
+    # 连上后不限时：等帧、检测、连拍都有各自的超时和时长限制
+    conn.sock.settimeout(None)
+    return conn
+
+
+def daemon_request(method, path, payload=None, url=DAEMON_URL, conn=None):
+    """向服务发请求，返回 (状态码, 响应字节)"""
+    conn = conn or connect(url)
+    try:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def forward_cli(tool, argv, url=DAEMON_URL):
+    """
+    把脚本的命令行交给服务执行，返回退出码；服务不可用或不接受这组参数时返回 None
+    """
+    if not url or url == "off" or any(a in ("--direct", "-h", "--help") for a in argv):
+        return None
+    try:
+        conn = connect(url)
+    except OSError:
+        return None
+    try:
+        status, body = daemon_request("POST", "/cli", {"tool": tool, "argv": argv, "cwd": os.getcwd()},
+                                      conn=conn)
+    except (OSError, http.client.HTTPException) as e:
+        # 已经交给服务执行了，不能再直接抓一遍
+        sys.stderr.write(f"快照服务请求失败: {e}\n")
+        return 1
+    if status != 200:
+        # 参数错误等：交给脚本自己处理（argparse 给出正常的报错）
+        return None
+    result = json.loads(body)
+    if result.get("stdout"):
+        sys.stdout.write(result["stdout"])
+    if result.get("stderr"):
+        sys.stderr.write(result["stderr"])
+    sys.stdout.flush()
+    return int(result.get("code", 0))
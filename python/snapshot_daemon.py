@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+常驻快照/检测服务（本机 HTTP）
+
+调度程序频繁调用 unv_save.py / detecet_cycle.py，每次都要启动 Python、导入
+cv2 和 NumPy、连 RTSP、等关键帧，一次好几秒。这个服务常驻：每个 RTSP 地址
+一个按需解码的 FrameGrabber（frame_grabber.py），请求来了只解码下一帧。
+两个脚本启动时先通过 snapshot_client.forward_cli 把命令行原样转过来，服务
+没在跑时才走原来的直接抓帧流程，调用方式不用改。
+
+接口（默认 127.0.0.1:1992，url 参数省略时用 unv_save 的默认地址）：
+    POST /cli            {"tool": "unv_save" | "detecet_cycle", "argv": [...], "cwd": "..."}
+    GET  /snapshot.jpg   ?url=&quality=90     返回 JPEG 字节
+    GET  /save           ?url=&path=          保存到输出目录（--save-dir）内的相对路径 path，返回 JSON
+    GET  /detect         ?url=&profile=largest  同 detecet_cycle 的 JSON
+    GET  /mjpeg          ?url=&quality=&scale=&fps=5  multipart 预览流
+    GET  /health         各路流状态、JPEG 缓存命中情况
+
+JPEG 编码都经过 jpeg_cache：同一帧同一 (质量, 缩放) 只编码一次，多个预览、
+快照、保存请求落在同一帧上时共用一份编码。
+
+超过 STREAM_IDLE 秒没人用的流自动断开。
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+
+import detecet_cycle
+import unv_save
+from frame_check import frame_status
+from frame_grabber import FrameGrabber
+from jpeg_cache import DEFAULT_QUALITY, JPEG_CACHE
+from multi_camera_server import SNAPSHOT_DIR, SNAPSHOT_EXTS, snapshot_path
+from snapshot_client import DAEMON_URL
+
+DEFAULT_URL = unv_save.build_parser().get_default("url")
+STREAM_IDLE = 600       # 流多久没人用就断开（秒）
+JPEG_QUALITY = 90
+MJPEG_FPS = 5           # /mjpeg 默认帧率
+MAX_FPS = 30            # /mjpeg 帧率上限
+MAX_TIMEOUT = 60        # 抓帧等待上限（秒）
+BOUNDARY = "frame"
+# /save 只能写到这个目录里（--save-dir 覆盖），path 只能是目录内的相对路径
+SAVE_DIR = SNAPSHOT_DIR
+
+
+class StreamPool:
+    """RTSP 地址 → 常驻 FrameGrabber，按需创建，空闲超时断开"""
+
+    def __init__(self, idle=STREAM_IDLE):
+        self.idle = idle
+        self._lock = threading.RLock()     # lease() 持锁调用 get()
+        self._streams = {}      # url → [grabber, 最后使用时间, 租用数]
+        threading.Thread(target=self._reap, name="stream-reaper", daemon=True).start()
+
+    def get(self, url):
+        """该地址的常驻 FrameGrabber（没有就创建）"""
+        with self._lock:
+            entry = self._streams.get(url)
+            if entry is None:
+                grabber = FrameGrabber(url, name=f"snap{len(self._streams) + 1}", on_demand=True).start()
+                entry = self._streams[url] = [grabber, time.time(), 0]
+            entry[1] = time.time()
+            return entry[0]
+
+    @contextmanager
+    def lease(self, url):
+        """
+        租用该地址的 FrameGrabber：租用期间不会因空闲被断开
+        （连拍/延时拍摄可能比 idle 还长，中途只读帧不会再调 get()）
+        """
+        with self._lock:
+            grabber = self.get(url)
+            entry = self._streams[url]
+            entry[2] += 1
+        try:
+            yield grabber
+        finally:
+            with self._lock:
+                entry[1] = time.time()
+                entry[2] -= 1
+
+    def grab(self, url, timeout=10):
+        """取该地址的下一帧（按需解码，最多等 timeout 秒），取不到返回 None"""
+        grabber = self.get(url)
+        latest = grabber.latest()
+        return grabber.wait_frame(timeout, newer_than=latest.seq if latest else 0)
+
+    def health(self):
+        with self._lock:
+            return {url: dict(grabber.health(), idle=round(time.time() - used, 1), leases=leases)
+                    for url, (grabber, used, leases) in self._streams.items()}
+
+    def _reap(self):
+        while True:
+            time.sleep(10)
+            with self._lock:
+                stale = [url for url, (_, used, leases) in self._streams.items()
+                         if not leases and time.time() - used > self.idle]
+                grabbers = [self._streams.pop(url)[0] for url in stale]
+            for grabber in grabbers:
+                grabber.stop()
+
+    def stop(self):
+        with self._lock:
+            grabbers = [entry[0] for entry in self._streams.values()]
+            self._streams.clear()
+        for grabber in grabbers:
+            grabber.stop()
+
+
+STREAMS = StreamPool()
+
+
+class GrabberSource:
+    """unv_save.capture_burst 的帧源：从常驻流按顺序取新帧（时间戳是采集时间）"""
+
+    def __init__(self, grabber, timeout=10):
+        self.grabber = grabber
+        self.timeout = timeout
+        latest = grabber.latest()
+        self.last_seq = latest.seq if latest else 0
+
+    def read(self):
+        frame = self.grabber.wait_frame(self.timeout, newer_than=self.last_seq)
+        if frame is None:
+            return None
+        self.last_seq = frame.seq
+        return frame.timestamp, frame.image
+
+    def skip(self, until):
+        # 按需解码：不要帧时后台只 grab，等到时间再取即可
+        time.sleep(max(0.0, until - time.time()))
+        return True
+
+    def close(self):
+        pass
+
+
+def save_frame(url, frame, path):
+    """保存一帧；JPEG 用缓存里的编码（质量同 cv2.imwrite 默认），返回是否成功"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SNAPSHOT_EXTS:
+        return False    # 扩展名不认识时 cv2.imwrite 直接抛 cv2.error
+    try:
+        if ext not in (".jpg", ".jpeg"):
+            return cv2.imwrite(path, frame.image)
+        data = JPEG_CACHE.get(url, frame, DEFAULT_QUALITY)
+        with open(path, "wb") as f:
+            f.write(data)
+    except (OSError, ValueError, cv2.error):
+        return False
+    return True
+
+
+# ---------- 脚本命令 ----------
+def run_unv_save(args, cwd):
+    """unv_save.py 的等价执行，返回 (退出码, 标准输出)"""
+    if unv_save.is_burst(args):
+        error = unv_save.burst_error(args)
+        if error:
+            return 2, error + "\n"
+        out_dir, options = unv_save.burst_options(args)
+        lines = []
+        with STREAMS.lease(args.url) as grabber:
+            manifest = unv_save.capture_burst(GrabberSource(grabber, args.timeout),
+                                              os.path.join(cwd, out_dir), log=lines.append, **options)
+        return (0 if manifest["captured"] else 1), "".join(line + "\n" for line in lines)
+    frame = STREAMS.grab(args.url, args.timeout)
+    if frame is None:
+        return 1, "错误：超时未获取到图像！\n"
+    path = os.path.join(cwd, args.output)
+    if not save_frame(args.url, frame, path):
+        return 1, f"保存失败: {args.output}\n"
+    return 0, f"图像已保存: {args.output}\n"
+
+
+def run_detecet_cycle(args, cwd):
+    """detecet_cycle.py 的等价执行，返回 (退出码, 标准输出)"""
+    frame = STREAMS.grab(args.url, args.timeout)
+    result = detecet_cycle.build_result(frame.image if frame is not None else None, args.profile)
+    return 0, detecet_cycle.format_result(result, args.pretty) + "\n"
+
+
+TOOLS = {
+    "unv_save": (unv_save.build_parser, run_unv_save),
+    "detecet_cycle": (detecet_cycle.build_parser, run_detecet_cycle),
+}
+
+
+class ArgumentError(Exception):
+    pass
+
+
+def parse_tool_args(tool, argv):
+    """用脚本自己的解析器解析；参数有错抛 ArgumentError（不让 argparse 退出进程）"""
+    build_parser, run = TOOLS[tool]
+    parser = build_parser()
+
+    def error(message):
+        raise ArgumentError(message)
+    parser.error = error
+    return parser.parse_args(argv), run
+
+
+# ---------- HTTP ----------
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    save_dir = SAVE_DIR         # /save 的输出目录（main 按 --save-dir 设置）
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_body(self, status, body, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, obj, status=200):
+        self.send_body(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def send_error_json(self, status, error, message):
+        self.send_json({"success": False, "error": error, "message": message,
+                        "timestamp": datetime.now().isoformat()}, status)
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/cli":
+            return self.send_error_json(404, "not_found", self.path)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length))
+            args, run = parse_tool_args(req["tool"], req.get("argv", []))
+        except (ValueError, KeyError, ArgumentError) as e:
+            return self.send_error_json(400, "bad_args", str(e))
+        try:
+            code, stdout = run(args, req.get("cwd") or os.getcwd())
+        except Exception as e:
+            return self.send_json({"code": 1, "stdout": "", "stderr": f"{type(e).__name__}: {e}\n"})
+        self.send_json({"code": code, "stdout": stdout})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        url = query.get("url", DEFAULT_URL)
+        if parts.path == "/health":
+            return self.send_json({"success": True, "streams": STREAMS.health(), "jpeg_cache": JPEG_CACHE.stats()})
+        if parts.path not in ("/snapshot.jpg", "/save", "/detect", "/mjpeg"):
+            return self.send_error_json(404, "not_found", parts.path)
+        try:
+            quality = int(query.get("quality", JPEG_QUALITY))
+            scale = float(query.get("scale", 1.0))
+            fps = float(query.get("fps", MJPEG_FPS))
+            timeout = float(query.get("timeout", 10))
+        except ValueError as e:
+            return self.send_error_json(400, "invalid_param", str(e))
+        if not (1 <= quality <= 100 and 0 < scale <= 1):
+            return self.send_error_json(400, "invalid_param", "quality 取 1~100，scale 取 (0, 1]")
+        # nan / inf 也在这里挡掉（nan 和任何数比较都不成立）
+        if not (0 < fps <= MAX_FPS and 0 < timeout <= MAX_TIMEOUT):
+            return self.send_error_json(400, "invalid_param",
+                                        f"fps 取 (0, {MAX_FPS}]，timeout 取 (0, {MAX_TIMEOUT}] 秒")
+        if parts.path == "/mjpeg":
+            return self.stream(url, quality, scale, fps)
+
+        if parts.path == "/save":
+            # 先校验路径再抓帧：不接受绝对路径、".." 和不支持的扩展名
+            try:
+                path = snapshot_path(self.save_dir, query.get("path", "snapshot.jpg"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            except ValueError as e:
+                return self.send_error_json(400, "invalid_path", str(e))
+            except OSError as e:
+                return self.send_error_json(500, "write_failed", str(e))
+
+        frame = STREAMS.grab(url, timeout)
+        if frame is None:
+            return self.send_error_json(504, "timeout", "无法从 RTSP 流获取图像")
+        if parts.path == "/snapshot.jpg":
+            try:
+                data = JPEG_CACHE.get(url, frame, quality, scale)
+            except ValueError:
+                return self.send_error_json(500, "encode_failed", "JPEG 编码失败")
+            return self.send_body(200, data, "image/jpeg")
+        if parts.path == "/save":
+            if not save_frame(url, frame, path):
+                return self.send_error_json(500, "write_failed", f"保存失败: {path}")
+            return self.send_json({"success": True, "path": path, "frame_seq": frame.seq,
+                                   "timestamp": datetime.fromtimestamp(frame.timestamp).isoformat(),
+                                   **frame_status(frame)})
+        result = detecet_cycle.build_result(frame.image, query.get("profile", "largest"))
+        self.send_json(dict(result, frame_seq=frame.seq, **frame_status(frame)))
+
+    def stream(self, url, quality, scale, fps):
+        """multipart 预览流：同一帧的编码由所有同参数的观看者共用"""
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        interval = 1.0 / fps
+        seq = 0
+        try:
+            while True:
+                started = time.time()
+                grabber = STREAMS.get(url)
+                latest = grabber.latest()
+                if latest is not None and latest.seq > seq and started - latest.timestamp < interval:
+                    frame = latest      # 别的观看者刚解码的帧，直接用（编码也在缓存里）
+                else:
+                    frame = grabber.wait_frame(10, newer_than=latest.seq if latest else 0)
+                if frame is None:
+                    continue
+                seq = frame.seq
+                data = JPEG_CACHE.get(url, frame, quality, scale)
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(data)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(data)
+                self.wfile.write(b"\r\n")
+                time.sleep(max(0.0, interval - (time.time() - started)))
+        except (OSError, ValueError):
+            pass                    # 客户端断开 / 编码失败
+
+
+def main():
+    default = urlsplit(DAEMON_URL)
+    parser = argparse.ArgumentParser(description="常驻快照/检测服务")
+    parser.add_argument("--host", default=default.hostname or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=default.port or 1992)
+    parser.add_argument("--save-dir", default=SAVE_DIR, help="/save 的输出目录")
+    args = parser.parse_args()
+
+    Handler.save_dir = args.save_dir
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"[快照服务] 监听 http://{args.host}:{args.port}（unv_save.py / detecet_cycle.py 自动转发）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        STREAMS.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,32 @@
 # - *- coding: utf-8 -*-
-import requests
-request_url = 'http://192.168.1.64:80/ISAPI/System/deviceInfo'
-# 设置认证信息
-auth = requests.auth.HTTPDigestAuth('admin', 'gene2025')
-# 发送请求，获取响应
-response = requests.get(request_url, auth=auth)
-# 输出响应内容
-print(response.text)
-
-response = requests.get("http://192.168.1.64/ISAPI/System/capabilities?type=all", auth=auth)
-# 输出响应内容
-print(response.text)
-
-response = requests.get("http://192.168.1.64/ISAPI/PTZCtrl/channels/1/capabilities", auth=auth)
-# 输出响应内容
-print(response.text)
-
-
-response = requests.get("http://192.168.1.64/ISAPI/PTZCtrl/channels/1/presets", auth=auth)
-# 输出响应内容
-print(response.text)
-
-
-response = requests.get("http://192.168.1.64/ISAPI/PTZCtrl/channels/1/status", auth=auth)
-# 输出响应内容
-print(response.text)
-
-response = requests.get("http://192.168.1.64/ISAPI/Streaming/channels/101/picture", auth=auth)
-if response.status_code == 200:
-    with open('camera_image.jpg', 'wb') as f:
-        f.write(response.content)
-    print("图片保存成功！")
-else:
-    print(f"请求失败，状态码：{response.status_code}")
-
-response = requests.get("http://192.168.1.64/ISAPI/Image/channels/1/focusConfiguration", auth=auth)
-# 输出响应内容
-print(response.text)
\ No newline at end of file
+import asyncio
+from camera_client import HikClient
+
+
+async def main():
+    # 一个会话：连接复用，Digest 质询只在第一次请求时往返一次
+    async with HikClient("http://192.168.1.64", "admin", "gene2025") as cam:
+        # 输出响应内容
+        print((await cam.get("ISAPI/System/deviceInfo")).decode("utf-8"))
+
+        print((await cam.get("ISAPI/System/capabilities?type=all")).decode("utf-8"))
+
+        print((await cam.get("ISAPI/PTZCtrl/channels/1/capabilities")).decode("utf-8"))
+
+        print((await cam.get("ISAPI/PTZCtrl/channels/1/presets")).decode("utf-8"))
+
+        print(await cam.status())
+
+        try:
+            jpeg = await cam.picture()
+            with open('camera_image.jpg', 'wb') as f:
+                f.write(jpeg)
+            print("图片保存成功！")
+        except Exception as e:
+            print(f"请求失败：{e}")
+
+        print((await cam.get("ISAPI/Image/channels/1/focusConfiguration")).decode("utf-8"))
+        print(cam.stats())
+
+
+asyncio.run(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+检测请求的分阶段计时和延迟统计
+
+- StageTimer：一次请求的计时器，记录帧采集时间、检测开始时的帧龄、
+  各阶段耗时（毫秒）和总耗时，block() 生成响应里的 timing 字段
+- stage(name)：给当前线程正在计时的请求记一个阶段；没有计时器时什么也不做，
+  检测函数里直接用，不用层层传参
+- LatencyStats：按名称保留最近 N 个样本，返回 p50/p95/p99，供 stats 命令使用
+
+用法:
+    timer = StageTimer()
+    with timer.stage("grab"):
+        grabbed = grab_frame()
+    timer.frame(grabbed.timestamp)
+    with activate(timer):
+        detect(...)            # 内部 with stage("hough"): ...
+    STATS.record(timer)
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+_local = threading.local()
+
+
+class StageTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.frame_timestamp = None     # 帧采集时间（time.time()）
+        self.frame_age_ms = None        # 开始检测时帧已经多旧
+        self.stages = {}                # 阶段名 → 毫秒（同名累加）
+        self.total_ms = None
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - t0) * 1000)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def frame(self, timestamp):
+        """记录帧采集时间，并以此刻作为"开始检测"计算帧龄"""
+        self.frame_timestamp = timestamp
+        self.frame_age_ms = (time.time() - timestamp) * 1000
+
+    def finish(self):
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self.total_ms
+
+    def block(self):
+        """响应里的 timing 字段"""
+        self.finish()
+        block = {}
+        if self.frame_timestamp is not None:
+            block["frame_time"] = datetime.fromtimestamp(self.frame_timestamp).isoformat()
+            block["frame_age_ms"] = round(self.frame_age_ms, 2)
+        block["stages_ms"] = {name: round(ms, 2) for name, ms in self.stages.items()}
+        block["total_ms"] = round(self.total_ms, 2)
+        return block
+
+
+@contextmanager
+def activate(timer):
+    """在当前线程内把 timer 设为 stage() 的记录目标"""
+    previous = getattr(_local, "timer", None)
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextmanager
+def stage(name):
+    """给当前线程的计时器记一个阶段，没有计时器时不计时"""
+    timer = getattr(_local, "timer", None)
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+class LatencyStats:
+    def __init__(self, window=1000):
+        self.window = window        # 每项保留最近多少个样本
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, ms):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(ms)
+
+    def record(self, timer):
+        """记录一次请求的全部阶段、帧龄和总耗时"""
+        for name, ms in timer.stages.items():
+            self.add(name, ms)
+        if timer.frame_age_ms is not None:
+            self.add("frame_age", timer.frame_age_ms)
+        self.add("total", timer.finish())
+
+    def snapshot(self):
+        """{名称: {count, p50, p95, p99, max}}，单位毫秒"""
+        with self._lock:
+            items = [(name, np.array(samples)) for name, samples in self._samples.items()]
+        result = {}
+        for name, values in items:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[name] = {
+                "count": int(values.size),
+                "p50": round(float(p50), 2),
+                "p95": round(float(p95), 2),
+                "p99": round(float(p99), 2),
+                "max": round(float(values.max()), 2),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
@@ -1,98 +1,260 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+"""
+MediaMTX WHEP（WebRTC）取帧
+
+WHEPClient 是长连接：一次 SDP/ICE/DTLS 协商后一直收帧，只保留最新一帧，
+断开（连接失败、收帧超时、服务端关闭）后按指数退避自动重连。
+- snapshot()  取最新的有效帧，已有新鲜帧时不用等，延迟小于一个帧间隔
+- frames()    异步迭代最新帧，消费慢时跳过中间帧，不积压
+
+收到的帧先保留解码后的 av.VideoFrame，只有真正有人要的那一帧才转 BGR，
+不取帧时不做整帧颜色转换。每帧先用 frame_check.check_av_frame 直接检查
+YUV 的 Y 平面（跨步采样），黑帧、纯色帧、拖影帧不发布，连接刚建立时解码器
+吐出的黑帧不会被取走，也不用为判断好坏先转 BGR；连续判坏太多帧时照常发布，
+WHEPFrame.suspect 带上原因。track 回调在 setRemoteDescription 之前注册，
+不会漏掉早到的轨道。
+
+    async with WHEPClient(url) as client:
+        image = await client.snapshot()
+        async for frame in client.frames():
+            ...
+"""
+
 import asyncio
 import aiohttp
 import cv2
 import argparse
 import sys
+import time
+from collections import namedtuple
+from urllib.parse import urljoin
 from aiortc import RTCPeerConnection, RTCSessionDescription
-from aiortc.rtcrtpparameters import RTCRtpCapabilities
-import json
+from frame_check import FrameGate, check_av_frame
+
+# 一帧：BGR 图像、收到的时间（time.time()）、序号（从 1 开始，重连后继续递增）、
+# suspect（连续判坏后放行的帧为判坏原因，正常为 None）
+WHEPFrame = namedtuple("WHEPFrame", ["image", "timestamp", "seq", "suspect"], defaults=(None,))
+
+FRAME_TIMEOUT = 5       # 多久收不到帧算断开（秒）
+RECONNECT_MIN = 0.5     # 重连退避（秒）
+RECONNECT_MAX = 10
+
 
 class WHEPClient:
-    def __init__(self, whep_url, output_path):
-        self.whep_url = whep_url  # 例如: http://192.168.1.100:8889/cam/webrtc/
-        self.output_path = output_path
-        self.pc = RTCPeerConnection()
-        self.frame = None
-        self.got_frame = asyncio.Event()
-
-    async def run(self):
-        # 1. 创建 offer
-        offer = await self.pc.createOffer()
-        await self.pc.setLocalDescription(offer)
-
-        # 2. POST offer 到 WHEP 端点
+    def __init__(self, whep_url, frame_timeout=FRAME_TIMEOUT, validate=True):
+        self.whep_url = whep_url  # 例如: http://192.168.1.100:8889/cam/whep
+        self.frame_timeout = frame_timeout
+        self.validate = validate    # 丢弃黑帧/纯色帧/拖影帧
+        self.connected = False
+        self.reconnects = 0
+        self.last_error = None
+        self._raw = None            # (av.VideoFrame, 时间, 序号, suspect)，最新一帧，未转换
+        self._converted = None      # 最近一次转换好的 WHEPFrame
+        self._seq = 0
+        self._gate = FrameGate()
+        self._cond = None
+        self._task = None
+        self._pc = None
+        self._session_url = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---------- 会话 ----------
+    async def start(self):
+        if self._task is None:
+            self._cond = asyncio.Condition()
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._teardown()
+
+    async def _run(self):
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                await self._session()
+                delay = RECONNECT_MIN
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.connected = False
+            await self._teardown()
+            self.reconnects += 1
+            print(f"[WHEP] 连接断开（{self.last_error}），{delay:.1f}s 后重连")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    async def _session(self):
+        """建立一次连接并一直收帧，断开时返回或抛异常"""
+        pc = self._pc = RTCPeerConnection()
+        track_ready = asyncio.get_running_loop().create_future()
+        closed = asyncio.Event()
+
+        # 先注册回调再协商，早到的轨道不会漏掉
+        @pc.on("track")
+        def on_track(track):
+            if track.kind == "video" and not track_ready.done():
+                track_ready.set_result(track)
+
+        @pc.on("connectionstatechange")
+        async def on_state():
+            if pc.connectionState in ("failed", "closed"):
+                closed.set()
+
+        # 只收视频
+        pc.addTransceiver("video", direction="recvonly")
+        offer = await pc.createOffer()
+        await pc.setLocalDescription(offer)
+
+        # POST offer 到 WHEP 端点
         async with aiohttp.ClientSession() as session:
-            print(f"发送 SDP offer 到: {self.whep_url}")
             async with session.post(
                 self.whep_url,
                 headers={"Content-Type": "application/sdp"},
-                data=self.pc.localDescription.sdp
+                data=pc.localDescription.sdp,
+                timeout=aiohttp.ClientTimeout(total=10),
             ) as resp:
                 if resp.status != 201:
-                    text = await resp.text()
-                    print(f"WHEP 错误 {resp.status}: {text}")
-                    sys.exit(1)
+                    raise ConnectionError(f"WHEP 错误 {resp.status}: {(await resp.text())[:200]}")
                 answer_sdp = await resp.text()
-                print("收到 SDP answer")
+                location = resp.headers.get("Location")
+                self._session_url = urljoin(self.whep_url, location) if location else None
 
-        # 3. 设置远程描述
-        await self.pc.setRemoteDescription(
-            RTCSessionDescription(sdp=answer_sdp, type="answer")
-        )
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=answer_sdp, type="answer"))
+        track = await asyncio.wait_for(track_ready, timeout=self.frame_timeout)
+        self.connected = True
+        self.last_error = None
+        print("[WHEP] 已连接，开始接收帧")
 
-        # 4. 处理接收的轨道
-        @self.pc.on("track")
-        def on_track(track):
-            if track.kind == "video":
-                print("收到视频轨道，开始接收帧...")
-                asyncio.create_task(self.handle_video_track(track))
+        while not closed.is_set():
+            frame = await asyncio.wait_for(track.recv(), timeout=self.frame_timeout)
+            suspect = None
+            if self.validate:
+                use, suspect = self._gate.admit(check_av_frame(frame))
+                if not use:
+                    continue
+            async with self._cond:
+                self._seq += 1
+                self._raw = (frame, time.time(), self._seq, suspect)
+                self._cond.notify_all()
+        raise ConnectionError(f"连接状态 {pc.connectionState}")
+
+    async def _teardown(self):
+        pc, self._pc = self._pc, None
+        if pc is not None:
+            await pc.close()
+        url, self._session_url = self._session_url, None
+        if url:
+            # 通知 MediaMTX 释放会话（失败无所谓，超时后服务端也会清理）
+            try:
+                async with aiohttp.ClientSession() as session:
+                    await session.delete(url, timeout=aiohttp.ClientTimeout(total=2))
+            except Exception:
+                pass
+
+    # ---------- 取帧 ----------
+    def _convert(self, raw):
+        """av.VideoFrame → WHEPFrame，同一帧只转换一次"""
+        frame, timestamp, seq, suspect = raw
+        converted = self._converted
+        if converted is None or converted.seq != seq:
+            converted = self._converted = WHEPFrame(frame.to_ndarray(format="bgr24"), timestamp, seq, suspect)
+        return converted
 
-        # 5. 等待抓到一帧
+    def latest(self):
+        """最新一帧（WHEPFrame），还没有帧返回 None"""
+        raw = self._raw
+        return self._convert(raw) if raw is not None else None
+
+    async def wait_frame(self, newer_than=0, timeout=FRAME_TIMEOUT):
+        """等待序号大于 newer_than 的帧，超时返回 None"""
+        async def newer():
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._raw is not None and self._raw[2] > newer_than)
+                return self._raw
         try:
-            await asyncio.wait_for(self.got_frame.wait(), timeout=15)
+            raw = await asyncio.wait_for(newer(), timeout)
         except asyncio.TimeoutError:
-            print("超时：未接收到视频帧")
-            sys.exit(1)
-        finally:
-            await self.pc.close()
-
-        # 6. 保存图像
-        if self.frame is not None:
-            success = cv2.imwrite(self.output_path, self.frame)
-            print(f"图像已保存: {self.output_path}" if success else "保存失败")
-        else:
-            print("未获取到图像帧")
-            sys.exit(1)
-
-    async def handle_video_track(self, track):
-        """接收第一帧后停止"""
-        try:
-            while not self.got_frame.is_set():
-                frame = await track.recv()
-                img = frame.to_ndarray(format="bgr24")
-                if img.mean() > 10:  # 过滤全黑帧
-                    self.frame = img
-                    self.got_frame.set()
-                    print("已抓取一帧")
-                    break
-                await asyncio.sleep(0.01)
-        except Exception as e:
-            print(f"接收帧错误: {e}")
+            return None
+        return self._convert(raw)
+
+    async def snapshot(self, timeout=15, max_age=None):
+        """
+        取最新的有效帧（图像），超时返回 None
+        max_age: 最新帧比这个（秒）旧时等下一帧；None 表示只要是当前连接上的最新帧就行
+        """
+        deadline = time.time() + timeout
+        frame = self.latest()
+        if frame is not None and self.connected and (max_age is None or time.time() - frame.timestamp <= max_age):
+            return frame.image
+        # 坏帧在收帧时已经丢掉（或标记了 suspect），等到的新帧直接可用
+        frame = await self.wait_frame(frame.seq if frame is not None else 0, max(0.0, deadline - time.time()))
+        return frame.image if frame is not None else None
+
+    async def frames(self):
+        """异步迭代最新帧（WHEPFrame）；消费比收帧慢时跳过中间帧"""
+        seq = 0
+        while True:
+            frame = await self.wait_frame(seq, timeout=None)
+            seq = frame.seq
+            yield frame
+
+    def health(self):
+        raw = self._raw
+        return {
+            "connected": self.connected,
+            "frames": self._seq,
+            "last_frame_age_ms": round((time.time() - raw[1]) * 1000, 1) if raw else None,
+            "rejected": self._gate.rejected,
+            "last_reject": self._gate.last_reject,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
 
 async def main():
-    parser = argparse.ArgumentParser(description="从 MediaMTX WHEP 流抓取一张图片")
-    parser.add_argument("url", nargs="?", 
+    parser = argparse.ArgumentParser(description="从 MediaMTX WHEP 流抓取图片")
+    parser.add_argument("url", nargs="?",
                         default="http://192.168.0.13:8889/cam/webrtc/whep/",
                         help="WHEP 端点 URL（默认: http://192.168.0.13:8889/cam/webrtc/whep/）")
     parser.add_argument("-o", "--output", default="whep_snapshot.jpg",
                         help="输出图片路径（默认: whep_snapshot.jpg）")
+    parser.add_argument("-n", "--count", type=int, default=1,
+                        help="在同一个连接上连续抓取几张（文件名自动加序号）")
+    parser.add_argument("--interval", type=float, default=1.0, help="连续抓取的间隔（秒）")
     args = parser.parse_args()
 
-    client = WHEPClient(args.url, args.output)
-    await client.run()
+    async with WHEPClient(args.url) as client:
+        for i in range(args.count):
+            t0 = time.perf_counter()
+            image = await client.snapshot()
+            if image is None:
+                print("超时：未接收到视频帧")
+                sys.exit(1)
+            path = args.output
+            if args.count > 1:
+                stem, dot, ext = args.output.rpartition(".")
+                path = f"{stem}_{i:03d}.{ext}" if dot else f"{args.output}_{i:03d}"
+            success = cv2.imwrite(path, image)
+            print(f"图像已保存: {path}（{(time.perf_counter() - t0) * 1000:.0f} ms）" if success else "保存失败")
+            if i + 1 < args.count:
+                await asyncio.sleep(args.interval)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+检测流水线的预分配工作缓冲区
+
+灰度、模糊、阈值、腐蚀等中间图每次检测都是同样大小，按名称缓存下来，
+OpenCV 调用时用 dst= 直接写进去，稳定运行后每次检测不再分配整帧数组。
+
+- 每个线程一套缓冲区，同一个检测引擎可以被多个线程同时调用
+- 请求的尺寸不超过已有缓冲区时返回左上角的视图（ROI 搜索时尺寸会变小），
+  更大时才重新分配
+- 返回的数组下一次检测就会被覆盖，需要留到以后用（例如交给调试图后台线程）
+  必须先拷贝
+"""
+
+import threading
+
+import numpy as np
+
+
+class WorkBuffers:
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, name, shape, dtype=np.uint8):
+        """取名为 name、形状为 shape 的缓冲区（内容未初始化）"""
+        pool = self._local.__dict__.setdefault("pool", {})
+        buf = pool.get(name)
+        if (buf is None or buf.dtype != dtype or buf.ndim != len(shape)
+                or any(have < want for have, want in zip(buf.shape, shape))):
+            # 按各维最大值分配，尺寸来回变化时不会反复分配
+            if buf is not None and buf.dtype == dtype and buf.ndim == len(shape):
+                shape_alloc = tuple(max(have, want) for have, want in zip(buf.shape, shape))
+            else:
+                shape_alloc = tuple(shape)
+            buf = pool[name] = np.empty(shape_alloc, dtype=dtype)
+        if buf.shape == tuple(shape):
+            return buf
+        return buf[tuple(slice(0, n) for n in shape)]
+
+    def nbytes(self):
+        """当前线程持有的缓冲区总字节数"""
+        return sum(buf.nbytes for buf in getattr(self._local, "pool", {}).values())